@@ -11,11 +11,17 @@ setup(
     packages=find_packages(),
     install_requires=[
         "pandas>=2.2.3",
+        "numpy>=1.22.4",
         "rich>=13.9.4",
         "platformdirs>=4.3.6",
         "XlsxWriter>=3.2.0",
         "pydantic>=2.0.0"
     ],
+    extras_require={
+        "parquet": ["pyarrow>=14.0.0"],
+        "archive": ["pyarrow>=14.0.0"],
+        "test": ["pytest>=7.0.0"],
+    },
     entry_points={
         "console_scripts": ["exptrack=src.main:main"],
     },
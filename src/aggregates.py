@@ -0,0 +1,260 @@
+"""Module for precomputed report aggregates used by periodic summaries"""
+
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src import archive
+from src import caps
+from src import exceptions
+from src import file_utils
+from src import fx
+from src import user_input
+
+
+ROLLUP_PERIODS = ["day", "week", "month", "year"]
+PERIOD_LABELS = {"day": "Date", "week": "Week", "month": "Month", "year": "Year"}
+# updates smaller than this skip pandas, whose per-call overhead dominates
+SMALL_UPDATE_ROWS = 64
+
+
+AGGREGATE_DIR_NAME = ".aggregates"
+
+
+def aggregate_dir(report_path: str) -> str:
+    """Return the hidden directory holding aggregates for a report's directory"""
+    return os.path.join(os.path.dirname(report_path), AGGREGATE_DIR_NAME)
+
+
+def aggregate_path(report_path: str) -> str:
+    """Return the path of the aggregate file kept for a report"""
+    return os.path.join(aggregate_dir(report_path), os.path.basename(report_path))
+
+
+def period_keys(dates: pd.Series) -> dict[str, pd.Series]:
+    """Map yyyy-mm-dd dates to ISO week, month and year labels"""
+    parsed = pd.to_datetime(dates, format=user_input.VALID_DATE_FORMAT)
+    iso = parsed.dt.isocalendar()
+    return {
+        "week": iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2),
+        "month": parsed.dt.strftime("%Y-%m"),
+        "year": parsed.dt.strftime("%Y"),
+    }
+
+
+def period_labels(date: str) -> dict[str, str]:
+    """Map a single yyyy-mm-dd date to its ISO week, month and year labels"""
+    parsed = datetime.strptime(date, user_input.VALID_DATE_FORMAT)
+    iso_year, iso_week, _ = parsed.isocalendar()
+    return {
+        "week": f"{iso_year}-W{iso_week:02d}",
+        "month": parsed.strftime("%Y-%m"),
+        "year": parsed.strftime("%Y"),
+    }
+
+
+def empty_aggregates() -> dict:
+    """Return aggregates for a report with no expenses"""
+    aggregates = {"fingerprint": None, "cells": {}, "currencies": {}}
+    for period in ROLLUP_PERIODS[1:]:
+        aggregates[period] = {}
+    return aggregates
+
+
+def add_to_cell(cells: dict, key: str, cents: int, count: int) -> None:
+    """Add cents and an expense count to a [cents, count] cell, dropping empty cells"""
+    cell = cells.setdefault(key, [0, 0])
+    cell[0] += cents
+    cell[1] += count
+    if cell[1] <= 0:
+        del cells[key]
+
+
+def update_currency_cells(aggregates: dict, expenses: pd.DataFrame, sign: int) -> None:
+    """Add or remove expenses with currency codes, kept per code, day and category"""
+    frame = pd.DataFrame(
+        {
+            "Currency": expenses["Currency"].to_numpy(),
+            "Date": expenses["Date"].to_numpy(),
+            "Category": expenses["Category"].fillna("").to_numpy(),
+            "Cents": caps.amounts_to_cents(expenses["Amount"]) * sign,
+            "Count": sign,
+        }
+    )
+    by_cell = frame.groupby(["Currency", "Date", "Category"])[["Cents", "Count"]].sum()
+    # aggregates saved before currencies were supported have no currency cells
+    currencies = aggregates.setdefault("currencies", {})
+    for (code, date, category), (cents, count) in by_cell.iterrows():
+        day_cells = currencies.setdefault(code, {}).setdefault(date, {})
+        add_to_cell(day_cells, category, int(cents), int(count))
+        if not day_cells:
+            del currencies[code][date]
+        if not currencies[code]:
+            del currencies[code]
+
+
+def update_aggregates(aggregates: dict, expenses: pd.DataFrame, sign: int) -> dict:
+    """Add (sign=1) or remove (sign=-1) expenses from the aggregates in place
+
+    Expenses with a currency code are kept apart from the day and period
+    totals, as their value in the reporting currency depends on the rate
+    table when the summary is built.
+    """
+    if "Currency" in expenses.columns:
+        coded = (expenses["Currency"].fillna("") != "").to_numpy()
+        if coded.any():
+            update_currency_cells(aggregates, expenses[coded], sign)
+            expenses = expenses[~coded]
+
+    if expenses.empty:
+        return aggregates
+
+    if len(expenses) <= SMALL_UPDATE_ROWS:
+        cents = caps.amounts_to_cents(expenses["Amount"]) * sign
+        categories = expenses["Category"].fillna("")
+        for date, category, amount in zip(expenses["Date"], categories, cents):
+            day_cells = aggregates["cells"].setdefault(date, {})
+            add_to_cell(day_cells, category, int(amount), sign)
+            if not day_cells:
+                del aggregates["cells"][date]
+            for period, label in period_labels(date).items():
+                add_to_cell(aggregates[period], label, int(amount), sign)
+        return aggregates
+
+    frame = pd.DataFrame(
+        {
+            "Date": expenses["Date"].to_numpy(),
+            "Category": expenses["Category"].fillna("").to_numpy(),
+            "Cents": caps.amounts_to_cents(expenses["Amount"]) * sign,
+            "Count": sign,
+        }
+    )
+    keys = period_keys(frame["Date"])
+
+    by_cell = frame.groupby(["Date", "Category"])[["Cents", "Count"]].sum()
+    for (date, category), (cents, count) in by_cell.iterrows():
+        day_cells = aggregates["cells"].setdefault(date, {})
+        add_to_cell(day_cells, category, int(cents), int(count))
+        if not day_cells:
+            del aggregates["cells"][date]
+
+    for period, key in keys.items():
+        by_period = frame.groupby(key.to_numpy())[["Cents", "Count"]].sum()
+        for label, (cents, count) in by_period.iterrows():
+            add_to_cell(aggregates[period], label, int(cents), int(count))
+    return aggregates
+
+
+def build_aggregates(report_df: pd.DataFrame) -> dict:
+    """Compute aggregates for every expense in a report"""
+    return update_aggregates(empty_aggregates(), report_df, 1)
+
+
+def load_aggregates(report_path: str) -> dict | None:
+    """Load a report's aggregates if they exist and match the report file"""
+    try:
+        with open(aggregate_path(report_path), "r") as aggregate_file:
+            aggregates = json.load(aggregate_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if aggregates.get("fingerprint") != archive.report_fingerprint(report_path):
+        return None
+    return aggregates
+
+
+def save_aggregates(
+    aggregates: dict, report_path: str, fingerprint: list[int] | None = None
+) -> None:
+    """Save aggregates, stamped with the given or current report fingerprint"""
+    if fingerprint is None:
+        fingerprint = archive.report_fingerprint(report_path)
+    aggregates["fingerprint"] = fingerprint
+    os.makedirs(aggregate_dir(report_path), exist_ok=True)
+    file_utils.write_file_atomically(
+        json.dumps(aggregates), aggregate_path(report_path)
+    )
+
+
+def remove_aggregates(report_path: str) -> None:
+    """Delete a report's aggregates"""
+    try:
+        os.remove(aggregate_path(report_path))
+    except FileNotFoundError:
+        pass
+
+
+def converted_currency_cells(
+    aggregates: dict, converter: fx.CurrencyConverter | None
+) -> pd.DataFrame:
+    """Return currency coded cells with cents converted to the reporting currency"""
+    cells = [
+        (code, date, category, cell[0])
+        for code, dates in aggregates.get("currencies", {}).items()
+        for date, categories in dates.items()
+        for category, cell in categories.items()
+    ]
+    cell_df = pd.DataFrame(cells, columns=["Currency", "Date", "Category", "Cents"])
+    if cell_df.empty:
+        return cell_df
+    if converter is None:
+        raise exceptions.MissingRateError(
+            "Error: Report has expenses in other currencies but no rate table"
+        )
+    # day totals per currency convert exactly, as rates are keyed by date
+    cell_df["Cents"] = converter.convert_cents(
+        cell_df["Date"], cell_df["Currency"], cell_df["Cents"].to_numpy()
+    )
+    return cell_df
+
+
+def summarise(
+    aggregates: dict,
+    cap_policy: caps.CapPolicy,
+    by: str = "day",
+    converter: fx.CurrencyConverter | None = None,
+) -> pd.DataFrame:
+    """Build an unformatted summary for a rollup period from the aggregate cells"""
+    cells = [
+        (date, category, cell[0])
+        for date, categories in sorted(aggregates["cells"].items())
+        for category, cell in categories.items()
+    ]
+    cell_df = pd.DataFrame(cells, columns=["Date", "Category", "Cents"])
+    converted_df = converted_currency_cells(aggregates, converter)
+    if not converted_df.empty:
+        cell_df = pd.concat(
+            [cell_df, converted_df[cell_df.columns]], ignore_index=True
+        ).sort_values("Date", kind="stable")
+    cell_df["Cents"] = cell_df["Cents"].astype(np.int64)
+    daily = caps.claimable_cents(
+        cell_df["Date"], cell_df["Category"], cell_df["Cents"], cap_policy
+    )
+
+    if by == "day":
+        labels = daily["Date"].to_numpy()
+        totals = daily["Total"].to_numpy()
+        claimable = daily["Claimable Total"].to_numpy()
+    else:
+        by_period = daily["Claimable Total"].groupby(
+            period_keys(daily["Date"])[by].to_numpy()
+        )
+        claimable_by_period = by_period.sum()
+        labels = claimable_by_period.index.to_numpy()
+        converted_totals = converted_df.groupby(
+            period_keys(converted_df["Date"])[by].to_numpy()
+        )["Cents"].sum()
+        totals = [
+            aggregates[by].get(label, [0])[0] + int(converted_totals.get(label, 0))
+            for label in labels
+        ]
+        claimable = claimable_by_period.to_numpy()
+
+    return pd.DataFrame(
+        {
+            PERIOD_LABELS[by]: labels,
+            "Total": caps.cents_to_decimal(totals),
+            "Claimable Total": caps.cents_to_decimal(claimable),
+        }
+    )
@@ -0,0 +1,368 @@
+"""Module for the in-process expense tracker API used by the CLI and services"""
+
+import os
+from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import AbstractContextManager
+from functools import partial
+import pandas as pd
+from src import archive
+from src import caps
+from src import config_manager
+from src import exceptions
+from src import exporters
+from src import fx
+from src import journal
+from src import recurrence
+from src import user_input
+from src import utils
+from src import validation
+
+
+def normalise_report_name(name: str) -> str:
+    """Return a report name without its .json extension"""
+    return name.removesuffix(".json")
+
+
+def check_valid_expenses(expenses: list[dict[str, str]]) -> None:
+    """Raise InvalidExpenseError if any expense has invalid types or values"""
+    invalid = validation.record_type_errors(expenses)
+    if not invalid.any():
+        expenses_df = pd.DataFrame(expenses, columns=utils.REPORT_COLUMNS).fillna(
+            utils.OPTIONAL_COLUMNS
+        )
+        invalid = validation.invalid_rows(expenses_df)
+    if invalid.any():
+        positions = ", ".join(str(pos) for pos in invalid.nonzero()[0])
+        raise exceptions.InvalidExpenseError(
+            f"Invalid expenses at positions: {positions}"
+        )
+
+
+class Report:
+    """An expense report stored in an ExpenseStore
+
+    Methods return data and raise src.exceptions errors instead of printing
+    or exiting, so they can be called in-process by other programs.
+    """
+
+    def __init__(self, store: "ExpenseStore", name: str):
+        self.store = store
+        self.name = normalise_report_name(name)
+        self.path = store.report_path(self.name)
+
+    def __repr__(self) -> str:
+        return f"Report({self.name!r})"
+
+    def exists(self) -> bool:
+        """Check if the report exists as a JSON file or an archive"""
+        return utils.report_exists(self.path)
+
+    def is_archived(self) -> bool:
+        """Check if the report is stored as a read-only archive"""
+        return archive.is_archived(self.path)
+
+    def lock(self) -> AbstractContextManager[None]:
+        """Return a lock that keeps other processes from changing the report
+
+        Hold it to look up an expense's ID and use it without the ID changing.
+        """
+        return utils.report_lock(self.path)
+
+    def check_exists(self) -> None:
+        """Raise ReportNotFoundError if the report file does not exist"""
+        if not self.exists():
+            raise exceptions.ReportNotFoundError(
+                f"The Expense Report '{self.name}' does not exist"
+            )
+
+    def expenses(self) -> pd.DataFrame:
+        """Return the report's expenses sorted by date, with Decimal amounts"""
+        self.check_exists()
+        return utils.json_to_report_df(self.path)
+
+    def add_expenses(
+        self, expenses: list[dict[str, str]], rule: dict | None = None
+    ) -> None:
+        """Validate and add expenses to the report in a single write
+
+        rule is the recurrence rule the expenses were expanded from, if any,
+        which is kept in the report's history.
+        """
+        self.check_exists()
+        check_valid_expenses(expenses)
+        utils.add_expenses_to_report(expenses, self.path, rule)
+
+    def add_expense(self, expense: dict[str, str]) -> None:
+        """Validate and add an expense to the report"""
+        self.add_expenses([expense])
+
+    def add_recurring_expense(
+        self,
+        expense: dict[str, str],
+        every: str,
+        interval: int = 1,
+        until: str | None = None,
+        count: int | None = None,
+    ) -> list[str]:
+        """Add an expense on every date of a recurrence rule in a single write
+
+        The rule starts on the expense's date and repeats every interval
+        days, weekdays, weeks, months or years, up to the until date or for
+        count occurrences. Returns the dates the expense was added on. Weekday
+        rules must start on a weekday, so the expense's date is always the first.
+        """
+        if (until is None) == (count is None):
+            raise ValueError("Give exactly one of until or count")
+        if every not in recurrence.FREQUENCIES:
+            raise exceptions.InvalidExpenseError(
+                f"Invalid recurrence {every!r}, expected one of "
+                f"{', '.join(recurrence.FREQUENCIES)}"
+            )
+        if not isinstance(interval, int) or interval < 1:
+            raise exceptions.InvalidExpenseError(
+                f"Invalid recurrence interval {interval!r}, "
+                "expected a whole number above 0"
+            )
+        if count is not None and (not isinstance(count, int) or count < 1):
+            raise exceptions.InvalidExpenseError(
+                f"Invalid recurrence count {count!r}, expected a whole number above 0"
+            )
+        # the expense is checked as entered, before its date is expanded
+        check_valid_expenses([expense])
+        if until is not None and not user_input.is_valid_date(until):
+            raise exceptions.InvalidExpenseError(
+                f"Invalid recurring expense end date {until!r}"
+            )
+        if every == "weekday" and not recurrence.is_weekday(expense["Date"]):
+            raise exceptions.InvalidExpenseError(
+                f"Weekday recurring expense starts on a weekend: {expense['Date']}"
+            )
+
+        dates = recurrence.occurrence_dates(
+            expense["Date"], every, interval, until, count
+        )
+        if not dates:
+            raise exceptions.InvalidExpenseError(
+                f"Recurring expense has no dates between {expense['Date']} and {until}"
+            )
+
+        rule = {"every": every, "interval": interval, "until": until, "count": count}
+        self.add_expenses([{**expense, "Date": date} for date in dates], rule)
+        return dates
+
+    def remove_expense(self, expense_id: int) -> dict[str, str]:
+        """Remove an expense by its 1-based ID, returning the removed expense"""
+        self.check_exists()
+        try:
+            return utils.rm_expense_from_report(expense_id, self.path)
+        except KeyError:
+            raise exceptions.ExpenseNotFoundError(
+                f"Report ID '{expense_id}' does not exist"
+            ) from None
+
+    def summary(
+        self, cap_policy: caps.CapPolicy | None = None, by: str = "day"
+    ) -> pd.DataFrame:
+        """Return totals and claimable totals grouped by day, week, month or year
+
+        Expenses with currency codes are converted to the reporting currency
+        using the store's rate table.
+        """
+        self.check_exists()
+        return utils.json_to_summary_df(
+            self.path, cap_policy or caps.CapPolicy(), by, self.store.converter
+        )
+
+    def total(self, report_df: pd.DataFrame | None = None) -> Decimal:
+        """Return the total of the report's expenses in the reporting currency"""
+        if report_df is None:
+            report_df = self.expenses()
+        return self.store.converter.total(report_df)
+
+    def export(
+        self,
+        export_dir: str,
+        export_format: str = "csv",
+        cap_policy: caps.CapPolicy | None = None,
+        currency: str = "",
+        by: str = "day",
+    ) -> list[str]:
+        """Export the report and its summary, returning the written file paths"""
+        report_df = self.expenses()
+        total = self.total(report_df)
+        report_df = self.store.converter.with_converted_amounts(report_df)
+        summary_df = self.summary(cap_policy, by)
+        paths = exporters.export_paths(export_dir, self.name, export_format)
+
+        if export_format == "xlsx":
+            utils.parse_report_to_xlsx(
+                utils.format_report_df(report_df, currency, total),
+                utils.format_summary_df(summary_df, currency),
+                paths[0],
+            )
+        else:
+            exporters.stream_report(
+                report_df, summary_df, export_dir, self.name, export_format
+            )
+        return paths
+
+    def search(self, query: str) -> pd.DataFrame:
+        """Return expenses whose descriptions contain every query term as a prefix"""
+        self.check_exists()
+        return utils.search_report(self.path, query)
+
+    def archive(self, compression: str = archive.DEFAULT_COMPRESSION) -> bool:
+        """Convert the report to a compressed archive, returning False if already one
+
+        Archived reports are read from typed columns by expenses, export and
+        search, summaries come from their aggregates, and they are unarchived
+        automatically when changed.
+        """
+        self.check_exists()
+        return utils.archive_report_file(self.path, compression)
+
+    def unarchive(self) -> bool:
+        """Convert an archived report back to JSON, returning False if not archived"""
+        self.check_exists()
+        return utils.unarchive_report_file(self.path)
+
+    def delete(self) -> None:
+        """Delete the report and its derived files"""
+        self.check_exists()
+        utils.delete_expense_report(self.path)
+
+
+class ExpenseStore:
+    """A directory of expense reports, with the rate table used to convert them"""
+
+    def __init__(
+        self,
+        report_dir: str | None = None,
+        converter: fx.CurrencyConverter | None = None,
+    ):
+        if report_dir is None:
+            report_dir = config_manager.AppInfo.report_dir
+        if converter is None:
+            # the configured reporting currency, as the CLI uses
+            converter = fx.CurrencyConverter(
+                config_manager.AppInfo.rates_path,
+                config_manager.init_reporting_currency(config_manager.init_config()),
+            )
+        self.report_dir = report_dir
+        self.converter = converter
+        os.makedirs(self.report_dir, exist_ok=True)
+
+    def __repr__(self) -> str:
+        return f"ExpenseStore({self.report_dir!r})"
+
+    def report_path(self, name: str) -> str:
+        """Return the file path of a report"""
+        return os.path.join(self.report_dir, f"{normalise_report_name(name)}.json")
+
+    def report_names(self) -> list[str]:
+        """Return the names of all reports in the store"""
+        return [
+            normalise_report_name(os.path.basename(path))
+            for path in utils.list_report_paths(self.report_dir)
+        ]
+
+    def report(self, name: str) -> Report:
+        """Return an existing report"""
+        report = Report(self, name)
+        report.check_exists()
+        return report
+
+    def create_report(self, name: str) -> Report:
+        """Create a new empty report"""
+        report = Report(self, name)
+        utils.create_expense_report(report.path)
+        return report
+
+    def delete_report(self, name: str) -> None:
+        """Delete a report"""
+        Report(self, name).delete()
+
+    def journaled_report(self, name: str) -> Report:
+        """Return a report that exists or has journaled changes, even if deleted"""
+        report = Report(self, name)
+        if not report.exists() and not journal.has_journal(report.path):
+            report.check_exists()
+        return report
+
+    def undo(self, name: str) -> dict:
+        """Revert a report's last change, returning the journal record of the change"""
+        return utils.undo_report_change(self.journaled_report(name).path)
+
+    def redo(self, name: str) -> dict:
+        """Reapply a report's last undone change, returning its journal record"""
+        return utils.redo_report_change(self.journaled_report(name).path)
+
+    def history(self, name: str) -> pd.DataFrame:
+        """Return a report's changes that can be undone, then those that can be redone"""
+        return utils.report_history(self.journaled_report(name).path)
+
+    def search(self, query: str, names: list[str] | None = None) -> pd.DataFrame:
+        """Search expense descriptions across reports, adding a Report column"""
+        if names is None:
+            names = self.report_names()
+        results = []
+        for name in names:
+            matches = self.report(name).search(query)
+            if not matches.empty:
+                matches.insert(0, "Report", normalise_report_name(name))
+                results.append(matches)
+
+        if not results:
+            return pd.DataFrame(columns=["Report", "ID", *utils.REPORT_COLUMNS])
+        return pd.concat(results, ignore_index=True)
+
+    def migrate_reports(
+        self, names: list[str] | None = None, workers: int | None = None
+    ) -> list[str]:
+        """Upgrade reports to the current schema in parallel, returning those changed"""
+        if names is None:
+            names = self.report_names()
+        reports = [self.report(name) for name in names]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                utils.migrate_report_file, [report.path for report in reports]
+            )
+            return [
+                report.name for report, upgraded in zip(reports, results) if upgraded
+            ]
+
+    def check_reports(
+        self,
+        names: list[str] | None = None,
+        repair: bool = False,
+        workers: int | None = None,
+    ) -> list[dict]:
+        """Check report files for corruption in parallel, optionally repairing them
+
+        Returns a result per report with its name, the problems found, each
+        with the byte offset and expense ID where it was found, how many
+        expenses were found and kept, and the copy made of a repaired report.
+        """
+        if names is None:
+            names = self.report_names()
+        reports = [self.report(name) for name in names]
+        workers = workers or os.cpu_count() or 1
+        paths = [report.path for report in reports]
+        # workers check batches of reports, validating each batch in one pass
+        batch_size = max(1, -(-len(paths) // (workers * 4)))
+        batches = [
+            paths[start : start + batch_size]
+            for start in range(0, len(paths), batch_size)
+        ]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batch_results = executor.map(
+                partial(utils.check_report_files, repair=repair), batches
+            )
+            results = [result for batch in batch_results for result in batch]
+        return [
+            {"report": report.name, **result}
+            for report, result in zip(reports, results)
+        ]
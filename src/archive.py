@@ -0,0 +1,148 @@
+"""Module for compressed, typed columnar archives of closed reports"""
+
+import os
+import pandas as pd
+from src import file_utils
+
+
+ARCHIVE_EXTENSION = ".arrow"
+ARCHIVE_COMPRESSIONS = ["zstd", "lz4", "none"]
+DEFAULT_COMPRESSION = "zstd"
+TEXT_COLUMNS = ["Description", "Category", "Currency"]
+
+
+def import_pyarrow():
+    """Import pyarrow, which is only needed for archived reports"""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError as e:
+        raise ImportError(
+            "Archived reports require pyarrow: "
+            "pip install 'expense-tracker-cli[archive]'"
+        ) from e
+    return pa
+
+
+def archive_path(report_path: str) -> str:
+    """Return the path of a report's archive file"""
+    return f"{report_path.removesuffix('.json')}{ARCHIVE_EXTENSION}"
+
+
+def is_archived(report_path: str) -> bool:
+    """Check if a report is stored only as an archive"""
+    # a JSON file takes precedence, e.g. after an interrupted archive or unarchive
+    return not os.path.exists(report_path) and os.path.exists(
+        archive_path(report_path)
+    )
+
+
+def stored_report_path(report_path: str) -> str:
+    """Return the file a report's data is currently stored in"""
+    return archive_path(report_path) if is_archived(report_path) else report_path
+
+
+def report_fingerprint(report_path: str) -> list[int]:
+    """Return the fingerprint of the file a report's data is stored in"""
+    return file_utils.file_fingerprint(stored_report_path(report_path))
+
+
+def archive_schema(pa):
+    """Return the column types of an archived report"""
+    return pa.schema(
+        [
+            ("Date", pa.date32()),
+            ("Amount", pa.decimal128(18, 2)),
+            ("Description", pa.dictionary(pa.int32(), pa.string())),
+            ("Category", pa.dictionary(pa.int32(), pa.string())),
+            ("Currency", pa.dictionary(pa.int32(), pa.string())),
+        ]
+    )
+
+
+def write_archive(
+    report_df: pd.DataFrame,
+    report_path: str,
+    compression: str = DEFAULT_COMPRESSION,
+) -> str:
+    """Write a validated report df with Decimal amounts to a read-only archive"""
+    pa = import_pyarrow()
+    schema = archive_schema(pa)
+    columns = {
+        "Date": pd.to_datetime(report_df["Date"], format="%Y-%m-%d").dt.date,
+        "Amount": report_df["Amount"],
+        "Description": report_df["Description"].astype(str),
+        "Category": report_df["Category"].astype(str),
+        "Currency": report_df["Currency"].astype(str),
+    }
+    arrays = [
+        pa.array(values.tolist()).cast(schema.field(col).type)
+        for col, values in columns.items()
+    ]
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    path = archive_path(report_path)
+    temp_path = file_utils.temp_file_path(path)
+    options = pa.ipc.IpcWriteOptions(
+        compression=None if compression == "none" else compression
+    )
+    with pa.OSFile(temp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, schema, options=options) as writer:
+            writer.write_table(table)
+    # archives are never modified in place, updates unarchive them first
+    os.chmod(temp_path, 0o444)
+    os.replace(temp_path, path)
+    return path
+
+
+def read_table(report_path: str):
+    """Read an archived report's typed columns as an arrow table via a memory map
+
+    Uncompressed archives are read without copying, compressed ones are
+    decompressed from the mapping.
+    """
+    pa = import_pyarrow()
+    with pa.memory_map(archive_path(report_path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def read_archive(report_path: str, rows: list[int] | None = None) -> pd.DataFrame:
+    """Read an archived report as a df of string values, matching JSON reports
+
+    If rows are given, only the rows at those 0-based positions are converted.
+    Converting to strings copies every value, so reads that only need typed
+    values use read_archive_expenses.
+    """
+    pa = import_pyarrow()
+    table = read_table(report_path)
+    if rows is not None:
+        table = table.take(rows)
+    # cast in arrow so values match the strings stored in JSON reports
+    table = table.cast(pa.schema([(col, pa.string()) for col in table.column_names]))
+    return table.to_pandas().astype(object)
+
+
+def read_archive_expenses(report_path: str) -> pd.DataFrame:
+    """Read an archived report as a df of expenses with Decimal amounts
+
+    Archives only hold validated expenses, so amounts are converted once
+    from their decimal column rather than through strings and revalidated.
+    """
+    pa = import_pyarrow()
+    table = read_table(report_path)
+    columns = {
+        "Date": table["Date"].cast(pa.string()).to_pandas().astype(object),
+        "Amount": table["Amount"].to_pandas(),
+    }
+    for col in TEXT_COLUMNS:
+        # dictionary columns convert to categoricals sharing their dictionary
+        columns[col] = table[col].to_pandas().astype(object)
+    return pd.DataFrame(columns)
+
+
+def remove_archive(report_path: str) -> None:
+    """Delete a report's archive file"""
+    try:
+        os.remove(archive_path(report_path))
+    except FileNotFoundError:
+        pass
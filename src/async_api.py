@@ -0,0 +1,145 @@
+"""Module for an asyncio facade over the expense tracker library API"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+import pandas as pd
+from src import api
+from src import caps
+
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class AsyncExpenseStore:
+    """Runs ExpenseStore operations in a bounded thread pool for asyncio code
+
+    Report file I/O and pandas transforms run off the event loop. Writes to
+    the same report are serialized by a per-report asyncio lock, while reads
+    run concurrently against the atomically replaced report files.
+    """
+
+    def __init__(
+        self,
+        store: api.ExpenseStore | None = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        self.store = store if store is not None else api.ExpenseStore()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="exptrack"
+        )
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    async def __aenter__(self) -> "AsyncExpenseStore":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the executor once queued operations finish"""
+        self.executor.shutdown(wait=True)
+
+    def lock(self, name: str) -> asyncio.Lock:
+        """Return the writer lock for a report"""
+        return self.locks.setdefault(api.normalise_report_name(name), asyncio.Lock())
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking function in the executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def run_locked(self, name: str, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking function in the executor while holding a report's lock"""
+        async with self.lock(name):
+            return await self.run(func, *args)
+
+    async def report_names(self) -> list[str]:
+        """Return the names of all reports in the store"""
+        return await self.run(self.store.report_names)
+
+    async def create_report(self, name: str) -> None:
+        """Create a new empty report"""
+        await self.run_locked(name, self.store.create_report, name)
+
+    async def delete_report(self, name: str) -> None:
+        """Delete a report"""
+        await self.run_locked(name, self.store.delete_report, name)
+
+    async def expenses(self, name: str) -> pd.DataFrame:
+        """Return a report's expenses sorted by date"""
+        return await self.run(lambda: self.store.report(name).expenses())
+
+    async def add_expenses(self, name: str, expenses: list[dict[str, str]]) -> None:
+        """Validate and add expenses to a report in a single write"""
+        await self.run_locked(
+            name, lambda: self.store.report(name).add_expenses(expenses)
+        )
+
+    async def add_expense(self, name: str, expense: dict[str, str]) -> None:
+        """Validate and add an expense to a report"""
+        await self.add_expenses(name, [expense])
+
+    async def add_recurring_expense(
+        self,
+        name: str,
+        expense: dict[str, str],
+        every: str,
+        interval: int = 1,
+        until: str | None = None,
+        count: int | None = None,
+    ) -> list[str]:
+        """Add an expense on every date of a recurrence rule in a single write"""
+        return await self.run_locked(
+            name,
+            lambda: self.store.report(name).add_recurring_expense(
+                expense, every, interval, until, count
+            ),
+        )
+
+    async def remove_expense(self, name: str, expense_id: int) -> dict[str, str]:
+        """Remove an expense by its 1-based ID, returning the removed expense"""
+        return await self.run_locked(
+            name, lambda: self.store.report(name).remove_expense(expense_id)
+        )
+
+    async def undo(self, name: str) -> dict:
+        """Revert a report's last change, returning the journal record of the change"""
+        return await self.run_locked(name, self.store.undo, name)
+
+    async def redo(self, name: str) -> dict:
+        """Reapply a report's last undone change, returning its journal record"""
+        return await self.run_locked(name, self.store.redo, name)
+
+    async def summary(
+        self, name: str, cap_policy: caps.CapPolicy | None = None, by: str = "day"
+    ) -> pd.DataFrame:
+        """Return a report's totals and claimable totals grouped by period"""
+        return await self.run(lambda: self.store.report(name).summary(cap_policy, by))
+
+    async def search(self, query: str, names: list[str] | None = None) -> pd.DataFrame:
+        """Search expense descriptions across reports"""
+        return await self.run(self.store.search, query, names)
+
+    async def archive(self, name: str, compression: str = "zstd") -> bool:
+        """Convert a report to a compressed archive, returning False if already one"""
+        return await self.run_locked(
+            name, lambda: self.store.report(name).archive(compression)
+        )
+
+    async def export(
+        self,
+        name: str,
+        export_dir: str,
+        export_format: str = "csv",
+        cap_policy: caps.CapPolicy | None = None,
+        currency: str = "",
+        by: str = "day",
+    ) -> list[str]:
+        """Export a report and its summary, returning the written file paths"""
+        return await self.run(
+            lambda: self.store.report(name).export(
+                export_dir, export_format, cap_policy, currency, by
+            )
+        )
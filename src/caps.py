@@ -0,0 +1,98 @@
+"""Module for claimable amount cap policies and the vectorized cap engine"""
+
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from pydantic import BaseModel
+
+
+CAP_PERIODS = ["daily", "weekly", "monthly"]
+UNLIMITED = "unlimited"
+# pandas period aliases used to bucket dates for each rolling cap
+PERIOD_FREQS = {"weekly": "W", "monthly": "M"}
+
+
+class CapPolicy(BaseModel):
+    """Claimable caps, as money strings or 'unlimited'. None inherits the default"""
+
+    daily: str | None = None
+    weekly: str | None = None
+    monthly: str | None = None
+    categories: dict[str, str] = {}
+
+    def merged_with(self, override: "CapPolicy") -> "CapPolicy":
+        """Return a policy with the override's set fields taking precedence"""
+        return CapPolicy(
+            daily=override.daily or self.daily,
+            weekly=override.weekly or self.weekly,
+            monthly=override.monthly or self.monthly,
+            categories={**self.categories, **override.categories},
+        )
+
+
+def cap_to_cents(cap: str | None) -> float:
+    """Convert a cap string to cents, unlimited caps become infinity"""
+    if cap is None or cap == UNLIMITED:
+        return np.inf
+    return float(Decimal(cap) * 100)
+
+
+def amounts_to_cents(amounts: pd.Series) -> np.ndarray:
+    """Convert a column of Decimal amounts to integer cents"""
+    return np.rint(amounts.to_numpy(dtype=float) * 100).astype(np.int64)
+
+
+def cents_to_decimal(cents: np.ndarray) -> list[Decimal]:
+    """Convert integer cents back to 2 decimal place Decimal amounts"""
+    return [Decimal(int(value)).scaleb(-2) for value in cents]
+
+
+def apply_period_cap(
+    claimable: np.ndarray, dates: pd.Series, period: str, cap: float
+) -> np.ndarray:
+    """Cap cumulative claimable totals within each week or month"""
+    if np.isinf(cap):
+        return claimable
+    buckets = pd.to_datetime(dates).dt.to_period(PERIOD_FREQS[period]).to_numpy()
+    running = pd.Series(claimable).groupby(buckets).cumsum()
+    capped = np.minimum(running.to_numpy(), cap)
+    # each day claims whatever its period's capped running total grew by
+    previous = pd.Series(capped).groupby(buckets).shift(fill_value=0).to_numpy()
+    return capped - previous
+
+
+def claimable_cents(
+    dates: pd.Series, categories: pd.Series, cents: pd.Series, policy: CapPolicy
+) -> pd.DataFrame:
+    """Group amounts in cents by date, returning daily totals and capped totals"""
+    cents = pd.Series(cents.to_numpy(), index=dates.index)
+    categories = categories.fillna("")
+
+    # per-category daily caps are applied to (date, category) totals
+    by_category = cents.groupby([dates, categories]).sum()
+    category_caps = (
+        by_category.index.get_level_values(1)
+        .map({name: cap_to_cents(cap) for name, cap in policy.categories.items()})
+        .to_numpy(dtype=float, na_value=np.inf)
+    )
+    claimable_by_category = pd.Series(
+        np.minimum(by_category.to_numpy(), category_caps), index=by_category.index
+    )
+
+    totals = by_category.groupby(level=0).sum()
+    claimable = claimable_by_category.groupby(level=0).sum().to_numpy()
+    claimable = np.minimum(claimable, cap_to_cents(policy.daily))
+
+    daily_dates = pd.Series(totals.index)
+    for period in PERIOD_FREQS:
+        claimable = apply_period_cap(
+            claimable, daily_dates, period, cap_to_cents(getattr(policy, period))
+        )
+
+    return pd.DataFrame(
+        {
+            "Date": totals.index.to_numpy(),
+            "Total": totals.to_numpy(),
+            "Claimable Total": np.rint(claimable).astype(np.int64),
+        }
+    )
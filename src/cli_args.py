@@ -2,8 +2,19 @@
 
 import argparse
 import os
+import re
+from src import aggregates
+from src import archive
+from src import caps
 from src import user_input
 from src import config_manager
+from src import journal
+from src import recurrence
+from src import utils
+from src import workload
+
+
+EXPORT_FORMATS = ["xlsx", "csv", "jsonl", "parquet"]
 
 
 def new_expense_report_name(filename):
@@ -14,7 +25,7 @@ def new_expense_report_name(filename):
     storage_directory = config_manager.AppInfo.report_dir
     file_path = os.path.join(storage_directory, filename)
 
-    if os.path.exists(file_path):
+    if utils.report_exists(file_path):
         filename_without_ext = filename.split(".")[0]
         raise argparse.ArgumentTypeError(
             f"Report: '{filename_without_ext}' already exists"
@@ -31,7 +42,24 @@ def is_valid_expense_report(filename):
     storage_directory = config_manager.AppInfo.report_dir
     file_path = os.path.join(storage_directory, filename)
 
-    if not os.path.exists(file_path):
+    if not utils.report_exists(file_path):
+        filename_without_ext = filename.split(".")[0]
+        raise argparse.ArgumentTypeError(
+            f"The Expense Report '{filename_without_ext}' does not exist"
+        )
+
+    return filename
+
+
+def is_journaled_report(filename):
+    """Validates report filename argument, allowing deleted reports with history"""
+    if not filename.endswith(".json"):
+        filename = filename + ".json"
+
+    storage_directory = config_manager.AppInfo.report_dir
+    file_path = os.path.join(storage_directory, filename)
+
+    if not utils.report_exists(file_path) and not journal.has_journal(file_path):
         filename_without_ext = filename.split(".")[0]
         raise argparse.ArgumentTypeError(
             f"The Expense Report '{filename_without_ext}' does not exist"
@@ -59,6 +87,54 @@ def is_valid_currency(currency):
     raise argparse.ArgumentTypeError(f"'{currency}' is not a valid currency symbol")
 
 
+def is_valid_currency_code(code):
+    """Validates a currency code argument, e.g. 'usd' -> 'USD'"""
+    code = code.upper()
+    if code != "" and user_input.is_valid_currency_code(code):
+        return code
+    raise argparse.ArgumentTypeError(
+        f"'{code}' is not a valid 3 letter currency code e.g. USD"
+    )
+
+
+def is_valid_rate(value):
+    """Validates an exchange rate argument, a positive decimal number"""
+    if re.match(r"^\d+(\.\d+)?$", value) and float(value) > 0:
+        return value
+    raise argparse.ArgumentTypeError(f"'{value}' is not a valid exchange rate")
+
+
+def is_valid_date(value):
+    """Validates a yyyy-mm-dd date argument"""
+    if user_input.is_valid_date(value):
+        return value
+    raise argparse.ArgumentTypeError(f"'{value}' is not a valid yyyy-mm-dd date")
+
+
+def is_positive_int(value):
+    """Validates a count argument, a whole number above 0"""
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    raise argparse.ArgumentTypeError(f"'{value}' is not a whole number above 0")
+
+
+def is_valid_operation_mix(mix):
+    """Validates a load test operation mix, e.g. 'update=50,summary=50'"""
+    try:
+        return workload.parse_mix(mix)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(
+            f"{e}, operations are {', '.join(workload.OPERATIONS)}"
+        ) from None
+
+
+def is_valid_export_dir(directory):
+    """Validates export --output argument, ensuring the directory exists"""
+    if not os.path.isdir(directory):
+        raise argparse.ArgumentTypeError(f"'{directory}' is not a directory")
+    return directory
+
+
 def parse_arguments():
     """Parses command line arguments"""
     parser = argparse.ArgumentParser(description="Expense tracker")
@@ -81,6 +157,34 @@ def parse_arguments():
     update_parser.add_argument(
         "filename", type=is_valid_expense_report, help="The filename to add expenses to"
     )
+    update_parser.add_argument(
+        "--every",
+        "-e",
+        choices=recurrence.FREQUENCIES,
+        default=None,
+        help="Repeat each expense from its date, e.g. a daily per diem "
+        "(weekday expenses must start on a weekday)",
+    )
+    update_parser.add_argument(
+        "--interval",
+        "-i",
+        type=is_positive_int,
+        default=1,
+        help="Repeat every n days, weekdays, weeks, months or years (default: 1)",
+    )
+    update_end = update_parser.add_mutually_exclusive_group()
+    update_end.add_argument(
+        "--until",
+        type=is_valid_date,
+        default=None,
+        help="Last date a repeated expense can occur on in yyyy-mm-dd format",
+    )
+    update_end.add_argument(
+        "--count",
+        type=is_positive_int,
+        default=None,
+        help="Number of times a repeated expense occurs",
+    )
 
     # Subcommand 'display'
     display_parser = subparser.add_parser(
@@ -97,6 +201,27 @@ def parse_arguments():
         action="store_true",
         help="Display the summarised report, grouped by date",
     )
+    display_parser.add_argument(
+        "--by",
+        "-b",
+        choices=aggregates.ROLLUP_PERIODS,
+        default="day",
+        help="Period to group the summarised report by (default: day)",
+    )
+
+    # Subcommand 'search'
+    search_parser = subparser.add_parser(
+        "search", help="Search expense descriptions across reports"
+    )
+    search_parser.add_argument(
+        "query", help="Words or word prefixes that descriptions must all contain"
+    )
+    search_parser.add_argument(
+        "reports",
+        nargs="*",
+        type=is_valid_expense_report,
+        help="Reports to search (default: all reports)",
+    )
 
     # Subcommand 'ls'
     subparser.add_parser("ls", help="List all expense reports")
@@ -122,15 +247,57 @@ def parse_arguments():
         help="the daily maximum amount allowed to be claimed",
     )
 
+    # Subcommand 'set-cap'
+    set_cap_parser = subparser.add_parser(
+        "set-cap", help="Set a daily, weekly, monthly or per-category claimable cap"
+    )
+    set_cap_parser.add_argument(
+        "period", choices=caps.CAP_PERIODS, help="The period the cap applies to"
+    )
+    set_cap_parser.add_argument(
+        "amount",
+        type=is_valid_arg_amount,
+        help="the maximum amount allowed to be claimed in the period",
+    )
+    set_cap_parser.add_argument(
+        "--category", "-c", help="Only cap daily expenses in this category"
+    )
+    set_cap_parser.add_argument(
+        "--report",
+        "-r",
+        type=is_valid_expense_report,
+        help="Override the cap for a single report",
+    )
+
     # Subcommand 'export'
     export_parser = subparser.add_parser(
-        "export", help="Export a specified expense report to an excel spreadsheet"
+        "export", help="Export a specified expense report to a spreadsheet or data file"
     )
     export_parser.add_argument(
         "filename",
         type=is_valid_expense_report,
         help="The name of the report to be exported",
     )
+    export_parser.add_argument(
+        "--format",
+        "-f",
+        choices=EXPORT_FORMATS,
+        default="xlsx",
+        help="Export file format (default: xlsx)",
+    )
+    export_parser.add_argument(
+        "--output",
+        "-o",
+        type=is_valid_export_dir,
+        help="Directory to export to, skipping the directory dialog",
+    )
+    export_parser.add_argument(
+        "--by",
+        "-b",
+        choices=aggregates.ROLLUP_PERIODS,
+        default="day",
+        help="Period to group the exported summary by (default: day)",
+    )
 
     # Subcommand 'set-currency'
     set_currency_parser = subparser.add_parser(
@@ -142,6 +309,202 @@ def parse_arguments():
         help="The currency symbol to be used in reports",
     )
 
+    # Subcommand 'set-reporting-currency'
+    set_reporting_currency_parser = subparser.add_parser(
+        "set-reporting-currency",
+        help="Set the currency code that summaries and totals are converted to",
+    )
+    set_reporting_currency_parser.add_argument(
+        "reporting_currency",
+        type=is_valid_currency_code,
+        help="The 3 letter code of the reporting currency e.g. GBP",
+    )
+
+    # Subcommand 'set-rate'
+    set_rate_parser = subparser.add_parser(
+        "set-rate",
+        help="Set the exchange rate from a currency to the reporting currency",
+    )
+    set_rate_parser.add_argument(
+        "currency_code",
+        type=is_valid_currency_code,
+        help="The 3 letter code of the currency e.g. USD",
+    )
+    set_rate_parser.add_argument(
+        "rate",
+        type=is_valid_rate,
+        help="Reporting currency units per unit of the currency e.g. 0.79",
+    )
+    set_rate_parser.add_argument(
+        "--date",
+        "-d",
+        type=is_valid_date,
+        default=None,
+        help="Date the rate applies from in yyyy-mm-dd format (default: all dates)",
+    )
+
+    # Subcommand 'migrate'
+    migrate_parser = subparser.add_parser(
+        "migrate", help="Upgrade expense reports to the current file format"
+    )
+    migrate_target = migrate_parser.add_mutually_exclusive_group(required=True)
+    migrate_target.add_argument(
+        "filename",
+        nargs="?",
+        type=is_valid_expense_report,
+        help="The name of the report to be migrated",
+    )
+    migrate_target.add_argument(
+        "--all", "-a", action="store_true", help="Migrate every expense report"
+    )
+    migrate_parser.add_argument(
+        "--workers",
+        "-w",
+        type=is_positive_int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+
+    # Subcommand 'fsck'
+    fsck_parser = subparser.add_parser(
+        "fsck", help="Check expense reports for corruption and repair them"
+    )
+    fsck_target = fsck_parser.add_mutually_exclusive_group(required=True)
+    fsck_target.add_argument(
+        "filename",
+        nargs="?",
+        type=is_valid_expense_report,
+        help="The name of the report to be checked",
+    )
+    fsck_target.add_argument(
+        "--all", "-a", action="store_true", help="Check every expense report"
+    )
+    fsck_parser.add_argument(
+        "--repair",
+        "-r",
+        action="store_true",
+        help="Rebuild damaged reports from their intact expenses",
+    )
+    fsck_parser.add_argument(
+        "--workers",
+        "-w",
+        type=is_positive_int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+
+    # Subcommand 'archive'
+    archive_parser = subparser.add_parser(
+        "archive",
+        help="Compress a finished report into a read-only archive",
+    )
+    archive_parser.add_argument(
+        "filename",
+        type=is_valid_expense_report,
+        help="The name of the report to be archived",
+    )
+    archive_parser.add_argument(
+        "--compression",
+        "-c",
+        choices=archive.ARCHIVE_COMPRESSIONS,
+        default=archive.DEFAULT_COMPRESSION,
+        help="Compression codec for the archive (default: zstd)",
+    )
+
+    # Subcommands 'undo', 'redo' and 'history'
+    undo_parser = subparser.add_parser("undo", help="Undo a report's last change")
+    undo_parser.add_argument(
+        "filename",
+        type=is_journaled_report,
+        help="The name of the report to undo a change in",
+    )
+    redo_parser = subparser.add_parser(
+        "redo", help="Redo a report's last undone change"
+    )
+    redo_parser.add_argument(
+        "filename",
+        type=is_journaled_report,
+        help="The name of the report to redo a change in",
+    )
+    history_parser = subparser.add_parser(
+        "history", help="Show a report's changes that can be undone or redone"
+    )
+    history_parser.add_argument(
+        "filename",
+        type=is_journaled_report,
+        help="The name of the report to show the history of",
+    )
+
+    # Subcommand 'generate'
+    generate_parser = subparser.add_parser(
+        "generate", help="Create reports of synthetic expenses for load testing"
+    )
+    generate_parser.add_argument(
+        "prefix", help="Reports are named <prefix>-0001, <prefix>-0002 and so on"
+    )
+    generate_parser.add_argument(
+        "--reports",
+        "-r",
+        type=is_positive_int,
+        default=10,
+        help="Number of reports to create (default: 10)",
+    )
+    generate_parser.add_argument(
+        "--expenses",
+        "-e",
+        type=is_positive_int,
+        default=1000,
+        help="Number of expenses per report (default: 1000)",
+    )
+    generate_parser.add_argument(
+        "--start",
+        type=is_valid_date,
+        default=None,
+        help="First expense date in yyyy-mm-dd format (default: a year ago)",
+    )
+    generate_parser.add_argument(
+        "--end",
+        type=is_valid_date,
+        default=None,
+        help="Last expense date in yyyy-mm-dd format (default: today)",
+    )
+    generate_parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed (default: 0)"
+    )
+
+    # Subcommand 'loadtest'
+    loadtest_parser = subparser.add_parser(
+        "loadtest",
+        help="Replay a mix of operations on generated reports from many processes",
+    )
+    loadtest_parser.add_argument(
+        "prefix", help="The prefix the reports were generated with"
+    )
+    loadtest_parser.add_argument(
+        "--processes",
+        "-p",
+        type=is_positive_int,
+        default=4,
+        help="Number of concurrent processes (default: 4)",
+    )
+    loadtest_parser.add_argument(
+        "--operations",
+        "-n",
+        type=is_positive_int,
+        default=100,
+        help="Number of operations per process (default: 100)",
+    )
+    loadtest_parser.add_argument(
+        "--mix",
+        "-m",
+        type=is_valid_operation_mix,
+        default=workload.DEFAULT_MIX,
+        help="Operation weights (default: update=50,summary=30,rm=10,export=10)",
+    )
+    loadtest_parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed (default: 0)"
+    )
+
     # Subcommand 'view-config'
     subparser.add_parser("view-config", help="View the config settings")
 
@@ -2,39 +2,42 @@
 
 import os
 import sys
-import pandas as pd
+from datetime import date, timedelta
 from rich.console import Console
+from src import api
+from src import archive
+from src import caps
 from src import config_manager
+from src import exceptions
+from src import exporters
+from src import fx
+from src import journal
+from src import migrations
 from src import utils
+from src import workload
 from src import user_input
 
 
-def create_new_report(storage_directory: str, filename: str, console: Console) -> None:
+def create_new_report(
+    store: "api.ExpenseStore", report_name: str, console: Console
+) -> None:
     """Create new expense report with columns"""
-    filename_with_ext = f"{filename}.json"
-    path = f"{storage_directory}/{filename_with_ext}"
-    columns = {
-        "Date": [],
-        "Amount": [],
-        "Description": [],
-    }
-    df_columns = pd.DataFrame(columns)
-    utils.save_expense_report(df_columns, path)
+    store.create_report(report_name)
 
-    console.print(f"\n[{utils.Colours.success}]Created new report: '{filename}'")
+    console.print(f"\n[{utils.Colours.success}]Created new report: '{report_name}'")
 
 
 def display_summary(
-    report_path: str,
+    store: "api.ExpenseStore",
     report_name: str,
-    max_claimable_amount: str,
+    cap_policy: caps.CapPolicy,
     currency: str,
     console: Console,
+    by: str = "day",
 ) -> None:
-    """Display summarised expense report grouped by date"""
-    formatted_report_df = utils.json_to_formatted_summary_df(
-        report_path, max_claimable_amount, currency
-    )
+    """Display summarised expense report grouped by date, week, month or year"""
+    summary_df = store.report(report_name).summary(cap_policy, by)
+    formatted_report_df = utils.format_summary_df(summary_df, currency)
 
     table = utils.create_table("Summary Report", report_name)
     table = utils.populate_summary_table(table, formatted_report_df)
@@ -44,10 +47,14 @@ def display_summary(
 
 
 def display_report(
-    report_path: str, report_name: str, currency: str, console: Console
+    store: "api.ExpenseStore", report_name: str, currency: str, console: Console
 ) -> None:
     """Display expense report"""
-    formatted_df = utils.json_to_formatted_report_df(report_path, currency)
+    report = store.report(report_name)
+    report_df = report.expenses()
+    formatted_df = utils.format_report_df(
+        report_df, currency, report.total(report_df)
+    )
 
     table = utils.create_table("Expense Report", report_name)
     table = utils.populate_report_table(table, formatted_df)
@@ -56,93 +63,362 @@ def display_report(
     console.print(table)
 
 
-def add_new_report_entry(report_path: str) -> None:
-    """Add a new expense to report and ask user to add another expense"""
+def add_new_report_entry(
+    store: "api.ExpenseStore",
+    report_name: str,
+    console: Console,
+    every: str | None = None,
+    interval: int = 1,
+    until: str | None = None,
+    count: int | None = None,
+) -> None:
+    """Add a new expense to report and ask user to add another expense
+
+    With every, each expense is repeated from its date until the until date
+    or for count occurrences, and the occurrences are added in one write.
+    """
+    if every is not None and until is None and count is None:
+        console.print(f"[{utils.Colours.error}]--every needs --until or --count")
+        sys.exit(1)
+    if every is None and (until is not None or count is not None):
+        console.print(f"[{utils.Colours.error}]--until and --count need --every")
+        sys.exit(1)
+
+    report = store.report(report_name)
     while True:
         print()  # Print blank line between expense entries
         expense = user_input.get_report_data()
         print()  # Print blank line between expense entry and continue adding prompt
-        utils.add_expense_to_report(expense, report_path)
+        if every is None:
+            report.add_expense(expense)
+        else:
+            dates = report.add_recurring_expense(
+                expense, every, interval, until, count
+            )
+            console.print(
+                f"[{utils.Colours.success}]Added {len(dates)} expenses from {
+                    dates[0]
+                } to {dates[-1]}"
+            )
         if not user_input.continue_adding_expenses():
             break
 
 
-def list_reports(storage_directory: str, console: Console) -> None:
+def list_reports(store: "api.ExpenseStore", console: Console) -> None:
     """List reports in reports directory"""
-    report_names = os.listdir(storage_directory)
+    report_names = store.report_names()
     # if the report directory is empty
     if report_names == []:
         console.print(f"[{utils.Colours.error}]There are no reports to list")
         sys.exit(1)
 
-    # remove extensions from expense reports
-    formatted_report_names = [file.split(".")[0] for file in report_names]
-
     console.print(f"\n[{utils.Colours.header}]Expense Reports:\n")
-    for report in formatted_report_names:
-        console.print(f"[{utils.Colours.body}]  - {report}")
+    for report in report_names:
+        archived = " (archived)" if store.report(report).is_archived() else ""
+        console.print(f"[{utils.Colours.body}]  - {report}{archived}")
 
 
-def handle_rm_row(row_id: int, report_path: str, console: Console) -> None:
+def handle_rm_row(
+    store: "api.ExpenseStore", row_id: int, report_name: str, console: Console
+) -> None:
     """Remove expense entry by specified ID"""
-    report = utils.load_expense_report(report_path)
-
     try:
-        report = utils.rm_row(row_id, report)
-    except KeyError:
-        console.print(f"[{utils.Colours.error}]Report ID '{row_id}' does not exist")
+        store.report(report_name).remove_expense(row_id)
+    except exceptions.ExpenseNotFoundError as e:
+        console.print(f"[{utils.Colours.error}]{e}")
         sys.exit(1)
 
-    report_df = pd.DataFrame(report).reset_index(drop=True)
-    utils.save_expense_report(report_df, report_path)
     console.print(f"[{utils.Colours.success}]Deleted Report ID: {row_id}")
 
 
-def delete_report(report_path: str, report_name: str, console: Console) -> None:
+def delete_report(
+    store: "api.ExpenseStore", report_name: str, console: Console
+) -> None:
     """Delete a specified report"""
     try:
-        os.remove(report_path)
+        store.delete_report(report_name)
         console.print(
             f"\n[{utils.Colours.success}]Successfully removed report: '{report_name}'"
         )
-    except FileNotFoundError:
+    except exceptions.ReportNotFoundError:
         print("Error: Report does not exist")
 
 
-def export_report_to_xlsx(
-    report_name: str,
-    report_path: str,
-    max_claimable_amount: str,
+def search_reports(
+    store: "api.ExpenseStore",
+    query: str,
+    report_names: list[str] | None,
     currency: str,
     console: Console,
 ) -> None:
-    """Export report to Excel spreadsheet"""
-    report_df = utils.json_to_formatted_report_df(report_path, currency)
-    summary_df = utils.json_to_formatted_summary_df(
-        report_path, max_claimable_amount, currency
-    )
+    """Display expenses whose descriptions match the search query"""
+    results_df = store.search(query, report_names)
+    if results_df.empty:
+        console.print(f"[{utils.Colours.error}]No expenses match '{query}'")
+        sys.exit(1)
+
+    formatted_df = utils.format_report_data(results_df, currency)
+    table = utils.create_table("Search Results", query)
+    table = utils.populate_search_table(table, formatted_df)
+    print()
+    console.print(table)
 
-    export_dir = user_input.prompt_export_dir()
+
+def resolve_export_dir(export_dir: str | None, console: Console) -> str:
+    """Return the export directory, prompting for one if not provided"""
+    if export_dir is None:
+        export_dir = user_input.prompt_export_dir()
     if export_dir is None:
         console.print(f"[{utils.Colours.error}]No Directory selected")
         sys.exit(1)
+    return export_dir
 
-    output_file = f"{report_name}.xlsx"
-    path = os.path.join(export_dir, output_file)
 
+def confirm_overwrite(path: str) -> None:
+    """Exit if the export file exists and the user declines to overwrite it"""
     if os.path.exists(path):
         overwrite = user_input.prompt_file_overwrite(path)
         if not overwrite:
             sys.exit(1)
 
-    utils.parse_report_to_xlsx(report_df, summary_df, path)
+
+def export_report(
+    store: "api.ExpenseStore",
+    report_name: str,
+    cap_policy: caps.CapPolicy,
+    currency: str,
+    export_format: str,
+    console: Console,
+    export_dir: str | None = None,
+    by: str = "day",
+) -> None:
+    """Export report to an Excel spreadsheet, or to csv, jsonl or parquet files"""
+    report = store.report(report_name)
+    export_dir = resolve_export_dir(export_dir, console)
+    for path in exporters.export_paths(export_dir, report_name, export_format):
+        confirm_overwrite(path)
+
+    try:
+        report.export(export_dir, export_format, cap_policy, currency, by)
+    except ImportError as e:
+        console.print(f"[{utils.Colours.error}]{e}")
+        sys.exit(1)
+
+    if export_format == "xlsx":
+        console.print(
+            f"[{utils.Colours.success}]Exported Expense Report '{report_name}' to {
+                export_dir
+            }"
+        )
+    else:
+        console.print(
+            f"[{utils.Colours.success}]Exported Expense Report '{report_name}' as {
+                export_format
+            } to {export_dir}"
+        )
+
+
+def migrate_reports(
+    store: "api.ExpenseStore",
+    report_names: list[str],
+    workers: int | None,
+    console: Console,
+) -> None:
+    """Upgrade report files to the current schema version in parallel"""
+    if report_names == []:
+        console.print(f"[{utils.Colours.error}]There are no reports to migrate")
+        sys.exit(1)
+
+    migrated = store.migrate_reports(report_names, workers)
+
+    for report_name in migrated:
+        console.print(f"[{utils.Colours.body}]  - Migrated '{report_name}'")
     console.print(
-        f"[{utils.Colours.success}]Exported Expense Report '{report_name}' to {
-            export_dir
-        }"
+        f"\n[{utils.Colours.success}]Migrated {len(migrated)} of {
+            len(report_names)
+        } reports to schema version {migrations.REPORT_SCHEMA_VERSION}"
     )
 
 
+def check_reports(
+    store: "api.ExpenseStore",
+    report_names: list[str],
+    repair: bool,
+    workers: int | None,
+    console: Console,
+) -> None:
+    """Check report files for corruption in parallel, repairing them if asked"""
+    if report_names == []:
+        console.print(f"[{utils.Colours.error}]There are no reports to check")
+        sys.exit(1)
+
+    results = store.check_reports(report_names, repair, workers)
+
+    damaged = [result for result in results if result["issues"]]
+    unrepaired = 0
+    for result in damaged:
+        console.print(f"\n[{utils.Colours.header}]'{result['report']}':")
+        for found in result["issues"]:
+            console.print(f"[{utils.Colours.body}]  - {utils.format_report_issue(found)}")
+
+        if result["backup"] is not None:
+            console.print(
+                f"[{utils.Colours.success}]  Repaired, kept {
+                    result['kept']
+                } expenses, original saved to {result['backup']}"
+            )
+        else:
+            unrepaired += 1
+            if result["kept"] is None:
+                console.print(f"[{utils.Colours.error}]  Can't be repaired")
+
+    colour = utils.Colours.error if unrepaired else utils.Colours.success
+    console.print(
+        f"\n[{colour}]Checked {len(results)} reports, {len(damaged)} damaged, {
+            len(damaged) - unrepaired
+        } repaired"
+    )
+    if unrepaired:
+        sys.exit(1)
+
+
+def archive_report(
+    store: "api.ExpenseStore", report_name: str, compression: str, console: Console
+) -> None:
+    """Convert a report to a compressed, read-only archive"""
+    report = store.report(report_name)
+    if not report.archive(compression):
+        console.print(
+            f"[{utils.Colours.error}]Report: '{report_name}' is already archived"
+        )
+        sys.exit(1)
+
+    archive_size = os.path.getsize(archive.archive_path(report.path))
+    console.print(
+        f"[{utils.Colours.success}]Archived report: '{report_name}' "
+        f"({archive_size} bytes)"
+    )
+
+
+def undo_change(
+    store: "api.ExpenseStore", report_name: str, console: Console
+) -> None:
+    """Undo the last change made to a report"""
+    change = store.undo(report_name)
+    console.print(
+        f"[{utils.Colours.success}]Undid change {change['seq']} to '{report_name}': "
+        f"{journal.describe(change)}"
+    )
+
+
+def redo_change(
+    store: "api.ExpenseStore", report_name: str, console: Console
+) -> None:
+    """Redo the last undone change to a report"""
+    change = store.redo(report_name)
+    console.print(
+        f"[{utils.Colours.success}]Redid change {change['seq']} to '{report_name}': "
+        f"{journal.describe(change)}"
+    )
+
+
+def display_history(
+    store: "api.ExpenseStore", report_name: str, console: Console
+) -> None:
+    """Display a report's changes that can be undone or redone"""
+    history_df = store.history(report_name)
+    if history_df.empty:
+        console.print(f"[{utils.Colours.error}]Report '{report_name}' has no history")
+        sys.exit(1)
+
+    table = utils.create_table("History", report_name)
+    table = utils.populate_history_table(table, history_df)
+    print()
+    console.print(table)
+
+
+def set_rate(
+    currency_code: str, rate: str, date: str | None, console: Console
+) -> None:
+    """Set an exchange rate in the rate table"""
+    fx.set_rate(config_manager.AppInfo.rates_path, currency_code, rate, date)
+    applies_from = f"from {date}" if date else "for all dates"
+    console.print(
+        f"[{utils.Colours.success}]Set {currency_code} rate to {rate} {applies_from}"
+    )
+
+
+def generate_reports(
+    store: "api.ExpenseStore",
+    prefix: str,
+    reports: int,
+    expenses: int,
+    start: str | None,
+    end: str | None,
+    seed: int,
+    console: Console,
+) -> None:
+    """Create reports of synthetic expenses, by default over the last year"""
+    today = date.today()
+    end = end or today.isoformat()
+    start = start or (today - timedelta(days=365)).isoformat()
+    if start > end:
+        console.print(f"[{utils.Colours.error}]--start must not be after --end")
+        sys.exit(1)
+
+    names = workload.generate_reports(
+        store, prefix, reports, expenses, start, end, seed
+    )
+    console.print(
+        f"[{utils.Colours.success}]Generated {len(names)} reports of {
+            expenses
+        } expenses: '{names[0]}' to '{names[-1]}'"
+    )
+
+
+def run_load_test(
+    store: "api.ExpenseStore",
+    prefix: str,
+    processes: int,
+    operations: int,
+    mix: dict[str, int],
+    cap_policy: caps.CapPolicy,
+    seed: int,
+    console: Console,
+) -> None:
+    """Replay a mix of operations on generated reports and display the results"""
+    names = workload.generated_reports(store, prefix)
+    if names == []:
+        console.print(
+            f"[{utils.Colours.error}]There are no reports generated with prefix "
+            f"'{prefix}', create them with 'exptrack generate {prefix}'"
+        )
+        sys.exit(1)
+
+    results = workload.load_test(
+        store, names, processes, operations, mix, cap_policy, seed
+    )
+
+    table = utils.create_table("Load Test", prefix)
+    table = utils.populate_load_test_table(table, results["stats"])
+    print()
+    console.print(table)
+    console.print(
+        f"[{utils.Colours.body}]{processes} processes, {len(names)} reports, {
+            results['throughput']:.1f
+        } operations/s"
+    )
+    if results["skipped"]:
+        console.print(
+            f"[{utils.Colours.body}]{results['skipped']} removals skipped, "
+            "their process had no expenses left to remove"
+        )
+    for error, count in results["errors"].items():
+        console.print(f"[{utils.Colours.error}]{count} x {error}")
+    colour = utils.Colours.error if results["lost_updates"] else utils.Colours.success
+    console.print(f"[{colour}]Lost updates: {results['lost_updates']}")
+
+
 def set_config_setting(
     config: dict[str, str],
     setting_name: str,
@@ -160,6 +436,37 @@ def set_config_setting(
         )
     elif setting_name == "currency":
         console.print(f"\n[{utils.Colours.success}]Currency set to: '{args_value}'")
+    elif setting_name == "reporting_currency":
+        console.print(
+            f"\n[{utils.Colours.success}]Reporting currency set to: '{args_value}'"
+        )
+
+
+def set_cap(
+    config: dict[str, str],
+    period: str,
+    amount: str,
+    category: str | None,
+    report_name: str | None,
+    console: Console,
+) -> None:
+    """Set a daily, weekly, monthly or per-category claimable cap"""
+    if category is not None and period != "daily":
+        console.print(f"[{utils.Colours.error}]Category caps can only be daily caps")
+        sys.exit(1)
+    # the global daily cap lives in config.json, as set by set-max
+    if period == "daily" and category is None and report_name is None:
+        set_config_setting(config, "max_claimable_amount", amount, console)
+        return
+
+    config_manager.set_cap(period, amount, category, report_name)
+    scope = f" for report '{report_name}'" if report_name else ""
+    target = f"'{category}' daily" if category else period
+    console.print(
+        f"\n[{utils.Colours.success}]Max {target} claimable amount{scope} set to: {
+            amount
+        }"
+    )
 
 
 def view_config(config: dict[str, str], console: Console):
@@ -167,3 +474,12 @@ def view_config(config: dict[str, str], console: Console):
     console.print(f"[{utils.Colours.header}]\nConfig settings:\n")
     for key, value in config.items():
         console.print(f"[{utils.Colours.body}] - {key}: {value}")
+
+    cap_config = config_manager.load_caps()
+    policies = {"default": cap_config.get("default", {})}
+    policies.update(cap_config.get("reports", {}))
+    console.print(f"[{utils.Colours.header}]\nClaimable caps:\n")
+    for scope, policy in policies.items():
+        for key, value in caps.CapPolicy(**policy).model_dump().items():
+            if value:
+                console.print(f"[{utils.Colours.body}] - {scope} {key}: {value}")
@@ -2,8 +2,10 @@
 
 import json
 import os
+from decimal import Decimal
 from platformdirs import user_config_dir, user_data_dir
 from rich.console import Console
+from src import caps
 from src import user_input
 from src import commands
 from src import utils
@@ -13,6 +15,7 @@ DEFAULT_CONFIG_VALUE = "NOT_SET"
 DEFAULT_CONFIG_SETTINGS = {
     "max_claimable_amount": DEFAULT_CONFIG_VALUE,
     "currency": DEFAULT_CONFIG_VALUE,
+    "reporting_currency": DEFAULT_CONFIG_VALUE,
 }
 
 
@@ -23,6 +26,8 @@ class AppInfo:
     report_dir = os.path.join(user_data_dir(app_name), "reports")
     config_dir = user_config_dir(app_name)
     config_path = os.path.join(config_dir, "config.json")
+    caps_path = os.path.join(config_dir, "caps.json")
+    rates_path = os.path.join(config_dir, "rates.csv")
 
 
 def load_config() -> dict[str, str] | None:
@@ -96,3 +101,58 @@ def init_currency(config: dict[str, str], console: Console) -> str:
         currency = user_input.prompt_for_currency()
         commands.set_config_setting(config, "currency", currency, console)
     return currency
+
+
+def init_reporting_currency(config: dict[str, str]) -> str:
+    """Initialises the reporting currency code, blank if it has not been set"""
+    reporting_currency = config["reporting_currency"]
+    if reporting_currency == DEFAULT_CONFIG_VALUE:
+        return ""
+    return reporting_currency
+
+
+def load_caps() -> dict:
+    """Load caps.json, returning an empty cap config if it does not exist"""
+    try:
+        with open(AppInfo.caps_path, "r") as caps_file:
+            return json.load(caps_file)
+    except FileNotFoundError:
+        return {"default": {}, "reports": {}}
+
+
+def save_caps(cap_config: dict) -> None:
+    """Update caps.json with new cap config"""
+    os.makedirs(AppInfo.config_dir, exist_ok=True)
+    with open(AppInfo.caps_path, "w") as caps_file:
+        json.dump(cap_config, caps_file, indent=4)
+
+
+def set_cap(
+    period: str, amount: str, category: str | None, report_name: str | None
+) -> None:
+    """Set a cap in the default policy or in a report's override policy"""
+    cap_config = load_caps()
+    if report_name is None:
+        policy = cap_config.setdefault("default", {})
+    else:
+        policy = cap_config.setdefault("reports", {}).setdefault(report_name, {})
+
+    if category is None:
+        policy[period] = amount
+    else:
+        policy.setdefault("categories", {})[category] = amount
+    save_caps(cap_config)
+
+
+def resolve_cap_policy(
+    max_claimable_amount: Decimal | str, report_name: str | None = None
+) -> caps.CapPolicy:
+    """Build the effective policy for a report from config and caps.json"""
+    cap_config = load_caps()
+    policy = caps.CapPolicy(daily=str(max_claimable_amount)).merged_with(
+        caps.CapPolicy(**cap_config.get("default", {}))
+    )
+    override = cap_config.get("reports", {}).get(report_name)
+    if override is not None:
+        policy = policy.merged_with(caps.CapPolicy(**override))
+    return policy
@@ -0,0 +1,45 @@
+"""Module for exceptions raised by the expense tracker library API"""
+
+
+class ExpenseTrackerError(Exception):
+    """Base class for expense tracker errors"""
+
+
+class ReportNotFoundError(ExpenseTrackerError, FileNotFoundError):
+    """Raised when an expense report does not exist"""
+
+
+class ReportExistsError(ExpenseTrackerError, FileExistsError):
+    """Raised when creating an expense report that already exists"""
+
+
+class ExpenseNotFoundError(ExpenseTrackerError, KeyError):
+    """Raised when an expense ID does not exist in a report"""
+
+    def __str__(self) -> str:
+        # KeyError quotes its message, print it as given instead
+        return str(self.args[0]) if self.args else ""
+
+
+class InvalidReportError(ExpenseTrackerError, ValueError):
+    """Raised when an expense report file contains invalid data"""
+
+
+class UnsupportedSchemaError(InvalidReportError):
+    """Raised when an expense report uses a newer schema version"""
+
+
+class InvalidExpenseError(ExpenseTrackerError, ValueError):
+    """Raised when expenses to be added contain invalid values"""
+
+
+class MissingRateError(ExpenseTrackerError, LookupError):
+    """Raised when an expense's currency has no exchange rate for its date"""
+
+
+class JournalError(ExpenseTrackerError):
+    """Raised when a report change can't be undone or redone"""
+
+
+class JournalConflictError(JournalError):
+    """Raised when a report was changed outside its journal"""
@@ -0,0 +1,90 @@
+"""Module for streaming expense report exports to data pipeline formats"""
+
+import os
+from typing import Callable, Iterator
+import pandas as pd
+
+
+EXPORT_CHUNK_SIZE = 50_000
+MONEY_COLUMNS = ("Amount", "Converted Amount", "Total", "Claimable Total")
+
+
+def iter_chunks(
+    df: pd.DataFrame, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """Yield consecutive row slices of a df"""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start : start + chunk_size]
+
+
+def money_columns(df: pd.DataFrame) -> list[str]:
+    """Return the monetary columns present in a df"""
+    return [col for col in MONEY_COLUMNS if col in df.columns]
+
+
+def write_csv(df: pd.DataFrame, export_path: str) -> None:
+    """Stream df rows to a csv file in chunks"""
+    df.to_csv(export_path, index=False, chunksize=EXPORT_CHUNK_SIZE)
+
+
+def write_jsonl(df: pd.DataFrame, export_path: str) -> None:
+    """Stream df rows to a JSON lines file in chunks, amounts as numbers"""
+    with open(export_path, "w") as export_file:
+        for chunk in iter_chunks(df):
+            chunk = chunk.astype({col: float for col in money_columns(chunk)})
+            chunk.to_json(export_file, orient="records", lines=True)
+
+
+def write_parquet(df: pd.DataFrame, export_path: str) -> None:
+    """Stream df rows to a parquet file, one row group per chunk"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Parquet export requires pyarrow: "
+            "pip install 'expense-tracker-cli[parquet]'"
+        ) from e
+
+    schema = pa.schema(
+        [
+            (col, pa.decimal128(18, 2) if col in money_columns(df) else pa.string())
+            for col in df.columns
+        ]
+    )
+    with pq.ParquetWriter(export_path, schema) as writer:
+        for chunk in iter_chunks(df):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            )
+
+
+EXPORT_WRITERS: dict[str, Callable[[pd.DataFrame, str], None]] = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+}
+
+
+def export_paths(export_dir: str, report_name: str, export_format: str) -> list[str]:
+    """Return the output paths for an export, detail data first"""
+    if export_format == "xlsx":
+        return [os.path.join(export_dir, f"{report_name}.xlsx")]
+    return [
+        os.path.join(export_dir, f"{report_name}.{export_format}"),
+        os.path.join(export_dir, f"{report_name}_summary.{export_format}"),
+    ]
+
+
+def stream_report(
+    report_df: pd.DataFrame,
+    summary_df: pd.DataFrame,
+    export_dir: str,
+    report_name: str,
+    export_format: str,
+) -> None:
+    """Write unformatted report and summary dfs using the chosen format writer"""
+    writer = EXPORT_WRITERS[export_format]
+    report_path, summary_path = export_paths(export_dir, report_name, export_format)
+    writer(report_df, report_path)
+    writer(summary_df, summary_path)
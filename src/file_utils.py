@@ -0,0 +1,88 @@
+"""Module for low level file helpers shared by report and index storage"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl, lock files with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+
+# locks held by the current thread, so nested changes don't deadlock
+held_locks = threading.local()
+
+
+def temp_file_path(path: str) -> str:
+    """Return a hidden temporary path next to path for an atomic write"""
+    directory, filename = os.path.split(path)
+    # unique per process and thread so concurrent writers never share a temp file
+    temp_name = f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    return os.path.join(directory, temp_name)
+
+
+def write_file_atomically(contents: str | bytes, path: str) -> None:
+    """Write a file via a hidden temporary file so readers never see partial data"""
+    temp_path = temp_file_path(path)
+    with open(temp_path, "wb" if isinstance(contents, bytes) else "w") as temp_file:
+        temp_file.write(contents)
+        temp_file.flush()
+        os.fsync(temp_file.fileno())
+    os.replace(temp_path, path)
+
+
+def file_fingerprint(path: str) -> list[int]:
+    """Return a file's modification time and size, used to detect changes"""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def lock_file(lock_file_obj) -> None:
+    """Block until an exclusive lock is held on an open lock file"""
+    if fcntl is not None:
+        fcntl.flock(lock_file_obj.fileno(), fcntl.LOCK_EX)
+        return
+    lock_file_obj.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file_obj.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after 10 seconds, keep waiting
+            continue
+
+
+def unlock_file(lock_file_obj) -> None:
+    """Release the lock held on an open lock file"""
+    if fcntl is not None:
+        fcntl.flock(lock_file_obj.fileno(), fcntl.LOCK_UN)
+        return
+    lock_file_obj.seek(0)
+    msvcrt.locking(lock_file_obj.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked(lock_path: str) -> Iterator[None]:
+    """Hold an exclusive lock shared by all processes, reentrant within a thread"""
+    counts = held_locks.__dict__.setdefault("counts", {})
+    if counts.get(lock_path):
+        counts[lock_path] += 1
+        try:
+            yield
+        finally:
+            counts[lock_path] -= 1
+        return
+
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a+") as lock_file_obj:
+        lock_file(lock_file_obj)
+        counts[lock_path] = 1
+        try:
+            yield
+        finally:
+            del counts[lock_path]
+            unlock_file(lock_file_obj)
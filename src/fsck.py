@@ -0,0 +1,509 @@
+"""Module for checking report files for corruption and salvaging their expenses"""
+
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from typing import Callable
+import numpy as np
+import pandas as pd
+from src import archive
+from src import migrations
+from src import validation
+
+
+FSCK_DIR_NAME = ".fsck"
+REQUIRED_COLUMNS = ["Date", "Amount", "Description"]
+ARROW_MAGIC = b"ARROW1"
+DECODER = json.JSONDecoder()
+WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+# bytes that are not valid UTF-8 are decoded to lone surrogates
+UNDECODABLE_FORMAT = "[\udc80-\udcff]"
+UNDECODABLE_PATTERN = re.compile(UNDECODABLE_FORMAT)
+
+
+def issue(offset: int | None, expense_id: int | None, problem: str) -> dict:
+    """Return a problem found in a report, at a character offset of its file"""
+    return {"offset": offset, "id": expense_id, "problem": problem}
+
+
+def fsck_dir(report_path: str) -> str:
+    """Return the hidden directory holding copies of repaired reports"""
+    return os.path.join(os.path.dirname(report_path), FSCK_DIR_NAME)
+
+
+def backup_report(report_path: str) -> str:
+    """Copy a report's stored file aside before it is repaired, returning the copy"""
+    stored_path = archive.stored_report_path(report_path)
+    name, extension = os.path.splitext(os.path.basename(stored_path))
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(fsck_dir(report_path), exist_ok=True)
+    backup_path = os.path.join(
+        fsck_dir(report_path), f"{name}.{timestamp}{extension}"
+    )
+    shutil.copy2(stored_path, backup_path)
+    return backup_path
+
+
+def skip_whitespace(text: str, pos: int) -> int:
+    """Return the offset of the next non-whitespace character"""
+    return WHITESPACE_PATTERN.match(text, pos).end()
+
+
+def walk_members(
+    text: str, pos: int, visit: Callable[[str | None, int], int]
+) -> int:
+    """Walk the JSON object or array at pos, returning the offset after it
+
+    visit is called with each member's key (None in arrays) and the offset
+    of its value, and returns the offset where the value ends.
+    """
+    is_object = text.startswith("{", pos)
+    close = "}" if is_object else "]"
+    pos = skip_whitespace(text, pos + 1)
+    if text.startswith(close, pos):
+        return pos + 1
+    while True:
+        key = None
+        if is_object:
+            if not text.startswith('"', pos):
+                raise json.JSONDecodeError(
+                    "Expecting property name enclosed in double quotes", text, pos
+                )
+            key, pos = DECODER.raw_decode(text, pos)
+            pos = skip_whitespace(text, pos)
+            if not text.startswith(":", pos):
+                raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+            pos = skip_whitespace(text, pos + 1)
+        pos = skip_whitespace(text, visit(key, pos))
+        if text.startswith(close, pos):
+            return pos + 1
+        if not text.startswith(",", pos):
+            raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+        pos = skip_whitespace(text, pos + 1)
+
+
+def scan_report(text: str) -> dict:
+    """Decode report file text member by member, recording where each value starts
+
+    Decoding stops at the first syntax error, keeping everything before it,
+    so the expenses ahead of a truncation or corruption can be salvaged.
+    """
+    scan = {"header": {}, "rows": None, "cells": {}, "error": None}
+
+    def visit_row(key: None, pos: int) -> int:
+        row, end = DECODER.raw_decode(text, pos)
+        scan["rows"].append((pos, row))
+        return end
+
+    def visit_cell(col: str) -> Callable[[str, int], int]:
+        def visit(key: str, pos: int) -> int:
+            value, end = DECODER.raw_decode(text, pos)
+            scan["cells"][col].setdefault(key, (pos, value))
+            return end
+
+        return visit
+
+    def visit_member(key: str, pos: int) -> int:
+        # version 2 rows are in a data array, version 1 columns are objects
+        if key == "data" and text.startswith("[", pos):
+            scan["rows"] = []
+            return walk_members(text, pos, visit_row)
+        if text.startswith("{", pos):
+            scan["cells"][key] = {}
+            return walk_members(text, pos, visit_cell(key))
+        value, end = DECODER.raw_decode(text, pos)
+        scan["header"][key] = (pos, value)
+        return end
+
+    try:
+        pos = skip_whitespace(text, 0)
+        if not text.startswith("{", pos):
+            raise json.JSONDecodeError("Expecting report object", text, pos)
+        end = skip_whitespace(text, walk_members(text, pos, visit_member))
+        if end != len(text):
+            raise json.JSONDecodeError("Extra data", text, end)
+    except json.JSONDecodeError as e:
+        scan["error"] = e
+    return scan
+
+
+def is_clean_report(report, report_columns: list[str]) -> bool:
+    """Check if decoded report data is structurally sound, for the fast path"""
+    if not isinstance(report, dict):
+        return False
+    if migrations.detect_version(report) == migrations.LEGACY_SCHEMA_VERSION:
+        columns = list(report.values())
+        return (
+            set(REQUIRED_COLUMNS) <= set(report) <= set(report_columns)
+            and all(isinstance(col, dict) for col in columns)
+            and all(list(col) == list(columns[0]) for col in columns)
+        )
+
+    columns, data = report.get("columns"), report.get("data")
+    return (
+        report["schema_version"] == migrations.REPORT_SCHEMA_VERSION
+        and isinstance(columns, list)
+        and set(REQUIRED_COLUMNS) <= set(columns)
+        and set(columns) <= set(report_columns)
+        and isinstance(data, list)
+        and all(isinstance(row, list) and len(row) == len(columns) for row in data)
+    )
+
+
+def header_columns(
+    scan: dict, report_columns: list[str], issues: list[dict]
+) -> list[str]:
+    """Return a version 2 report's columns, or the default columns if unreadable"""
+    pos, columns = scan["header"].get("columns", (None, None))
+    if isinstance(columns, list) and set(columns) <= set(report_columns):
+        missing = [col for col in REQUIRED_COLUMNS if col not in columns]
+        if missing:
+            issues.append(issue(pos, None, f"Missing columns: {', '.join(missing)}"))
+        return columns
+
+    if columns is None:
+        # unless the header was lost to a syntax error, which is reported
+        if scan["error"] is None:
+            issues.append(issue(pos, None, "Missing column header"))
+    else:
+        issues.append(issue(pos, None, f"Invalid column header {columns!r}"))
+    # reports are written with every column in this order
+    return report_columns
+
+
+def scanned_rows(
+    scan: dict, report_columns: list[str], issues: list[dict]
+) -> tuple[list[str], list[tuple[int, list | None]]]:
+    """Return the columns and the offset and values of each expense found
+
+    Values are None for expenses whose columns are misaligned.
+    """
+    if scan["cells"] and "schema_version" not in scan["header"]:
+        return legacy_rows(scan, issues)
+
+    columns = header_columns(scan, report_columns, issues)
+    if scan["rows"] is None:
+        if scan["error"] is None:
+            issues.append(issue(None, None, "Missing expense data"))
+        return columns, []
+
+    rows = []
+    for expense_id, (pos, row) in enumerate(scan["rows"], start=1):
+        if isinstance(row, list) and len(row) == len(columns):
+            rows.append((pos, row))
+            continue
+        count = len(row) if isinstance(row, list) else 1
+        issues.append(
+            issue(
+                pos, expense_id, f"Expense has {count} values, expected {len(columns)}"
+            )
+        )
+        rows.append((pos, None))
+    return columns, rows
+
+
+def legacy_rows(
+    scan: dict, issues: list[dict]
+) -> tuple[list[str], list[tuple[int, list | None]]]:
+    """Return the columns and expenses of a version 1 column dict report"""
+    columns = list(scan["cells"])
+    keys = list(dict.fromkeys(key for col in columns for key in scan["cells"][col]))
+    rows = []
+    for expense_id, key in enumerate(keys, start=1):
+        cells = [scan["cells"][col].get(key) for col in columns]
+        pos = min(cell[0] for cell in cells if cell is not None)
+        missing = [col for col, cell in zip(columns, cells) if cell is None]
+        if missing:
+            issues.append(
+                issue(pos, expense_id, f"Expense is missing its {', '.join(missing)}")
+            )
+            rows.append((pos, None))
+        else:
+            rows.append((pos, [cell[1] for cell in cells]))
+    return columns, rows
+
+
+def syntax_issue(text: str, error: json.JSONDecodeError) -> dict:
+    """Return the problem for a JSON syntax error"""
+    # a report is one object, so one that is never closed was cut short
+    started = text.lstrip().startswith("{")
+    if started and (
+        skip_whitespace(text, error.pos) >= len(text)
+        or not text.rstrip().endswith("}")
+    ):
+        return issue(error.pos, None, "Report ends unexpectedly, it was truncated")
+    return issue(error.pos, None, f"Invalid JSON: {error.msg}")
+
+
+def check_expenses(
+    report_df: pd.DataFrame,
+    offsets: list[int | None],
+    expense_ids: np.ndarray,
+    issues: list[dict],
+    absent_columns: list[str],
+) -> np.ndarray:
+    """Record invalid expense values, returning a mask of valid expenses
+
+    Columns missing from the report are already reported once, so their
+    values are not reported for every expense.
+    """
+    errors = validation.expense_error_masks(report_df)
+    for col in errors.columns.difference(absent_columns, sort=False):
+        for position in np.flatnonzero(errors[col].to_numpy()):
+            value = report_df[col].iloc[position]
+            issues.append(
+                issue(
+                    offsets[position],
+                    int(expense_ids[position]),
+                    f"Invalid {col} {value!r}",
+                )
+            )
+    valid = ~errors.any(axis=1).to_numpy(dtype=bool)
+
+    dates = report_df["Date"].to_numpy(dtype=object)[valid]
+    out_of_order = np.flatnonzero(dates[1:] < dates[:-1])
+    if len(out_of_order):
+        position = np.flatnonzero(valid)[out_of_order[0] + 1]
+        issues.append(
+            issue(
+                offsets[position],
+                int(expense_ids[position]),
+                "Expenses are not in date order",
+            )
+        )
+    return valid
+
+
+def salvage(
+    columns: list[str],
+    rows: list[tuple[int | None, list | None]],
+    report_columns: list[str],
+    optional_columns: dict[str, str],
+    issues: list[dict],
+) -> pd.DataFrame:
+    """Return the intact, valid expenses of a report sorted by date"""
+    intact = [position for position, (_, row) in enumerate(rows) if row is not None]
+    report_df = pd.DataFrame(
+        [rows[position][1] for position in intact], columns=columns, dtype=object
+    )
+    for col, default in optional_columns.items():
+        if col not in report_df.columns:
+            report_df[col] = default
+    absent_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    for col in absent_columns:
+        report_df[col] = None
+
+    undecodable = np.array(
+        [
+            any(
+                isinstance(value, str) and UNDECODABLE_PATTERN.search(value)
+                for value in row
+            )
+            for row in report_df.itertuples(index=False)
+        ],
+        dtype=bool,
+    )
+    for position in np.flatnonzero(undecodable):
+        issues.append(
+            issue(
+                rows[intact[position]][0],
+                intact[position] + 1,
+                "Expense contains bytes that are not valid UTF-8",
+            )
+        )
+
+    offsets = [rows[position][0] for position in intact]
+    expense_ids = np.array(intact, dtype=np.int64) + 1
+    valid = ~undecodable & check_expenses(
+        report_df, offsets, expense_ids, issues, absent_columns
+    )
+    report_df = report_df[valid].reset_index(drop=True)
+    return report_df.sort_values(by="Date", kind="stable")[report_columns]
+
+
+def byte_offsets(text: str, issues: list[dict]) -> list[dict]:
+    """Convert the character offsets of problems to byte offsets in the file"""
+    if text.isascii():
+        return issues
+    char_bytes = np.array(
+        [len(char.encode("utf-8", "surrogateescape")) for char in text],
+        dtype=np.int64,
+    )
+    starts = np.concatenate([[0], np.cumsum(char_bytes)])
+    for found in issues:
+        if found["offset"] is not None:
+            found["offset"] = int(starts[found["offset"]])
+    return issues
+
+
+def read_report_text(report_path: str) -> tuple[str, bool]:
+    """Read a report file's text, and whether it was valid UTF-8"""
+    with open(report_path, "rb") as report_file:
+        data = report_file.read()
+    try:
+        return data.decode("utf-8"), True
+    except UnicodeDecodeError:
+        return data.decode("utf-8", "surrogateescape"), False
+
+
+def clean_rows(
+    text: str, report_columns: list[str], optional_columns: dict[str, str]
+) -> list[list] | None:
+    """Return a sound report's rows in the current columns, or None if unsound"""
+    try:
+        report = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if not is_clean_report(report, report_columns):
+        return None
+
+    report = migrations.migrate(report)
+    columns = report["columns"]
+    if columns == report_columns:
+        return report["data"]
+    # older reports lack the optional columns
+    positions = [
+        columns.index(col) if col in columns else None for col in report_columns
+    ]
+    defaults = [optional_columns.get(col) for col in report_columns]
+    return [
+        [
+            row[position] if position is not None else default
+            for position, default in zip(positions, defaults)
+        ]
+        for row in report["data"]
+    ]
+
+
+def check_json_report(
+    report_path: str, report_columns: list[str], optional_columns: dict[str, str]
+) -> dict:
+    """Check a JSON report file, salvaging its intact, valid expenses"""
+    text, valid_utf8 = read_report_text(report_path)
+    issues = []
+    if not valid_utf8:
+        first_undecodable = UNDECODABLE_PATTERN.search(text).start()
+        issues.append(issue(first_undecodable, None, "Report is not valid UTF-8"))
+    scan = scan_report(text)
+    if scan["error"] is not None:
+        issues.append(syntax_issue(text, scan["error"]))
+
+    version_pos, version = scan["header"].get("schema_version", (None, None))
+    if isinstance(version, int) and version > migrations.REPORT_SCHEMA_VERSION:
+        issues.append(
+            issue(version_pos, None, f"Unsupported schema version {version}")
+        )
+        # rows of a newer schema can't be interpreted, so nothing is salvaged
+        return {
+            "issues": byte_offsets(text, issues),
+            "expenses": None,
+            "salvaged": None,
+        }
+
+    columns, rows = scanned_rows(scan, report_columns, issues)
+    salvaged = salvage(columns, rows, report_columns, optional_columns, issues)
+    issues.sort(key=lambda found: (found["offset"] is None, found["offset"] or 0))
+    return {
+        "issues": byte_offsets(text, issues),
+        "expenses": len(rows),
+        "salvaged": salvaged,
+    }
+
+
+def archive_damage_offset(report_path: str) -> int | None:
+    """Return where an unreadable archive is damaged, if its framing shows it"""
+    path = archive.archive_path(report_path)
+    size = os.path.getsize(path)
+    with open(path, "rb") as archive_file:
+        head = archive_file.read(len(ARROW_MAGIC))
+        archive_file.seek(max(size - len(ARROW_MAGIC), 0))
+        tail = archive_file.read()
+    if head != ARROW_MAGIC:
+        return 0
+    # the file ends with a footer and the magic, which truncation loses
+    if tail != ARROW_MAGIC:
+        return size
+    return None
+
+
+def check_archived_report(
+    report_path: str, report_columns: list[str], optional_columns: dict[str, str]
+) -> dict:
+    """Check an archived report, whose expenses have no byte offsets"""
+    try:
+        report_df = archive.read_archive(report_path)
+    except ImportError as e:
+        return {"issues": [issue(None, None, str(e))], "expenses": None, "salvaged": None}
+    except (OSError, ValueError) as e:
+        problem = f"Archive can't be read: {e}"
+        return {
+            "issues": [issue(archive_damage_offset(report_path), None, problem)],
+            "expenses": None,
+            "salvaged": None,
+        }
+
+    rows = [(None, row) for row in report_df.values.tolist()]
+    issues = []
+    salvaged = salvage(
+        list(report_df.columns), rows, report_columns, optional_columns, issues
+    )
+    return {
+        "issues": issues,
+        "expenses": len(rows),
+        "salvaged": salvaged if issues else None,
+    }
+
+
+def check_reports(
+    report_paths: list[str],
+    report_columns: list[str],
+    optional_columns: dict[str, str],
+) -> list[dict]:
+    """Check report files, returning each one's problems and salvageable expenses
+
+    Problems are dicts with the byte offset in the file where they were found,
+    the 1-based ID of the affected expense and a description. The salvaged df
+    is None if the report is sound or can't be salvaged.
+
+    The expenses of every structurally sound report are validated together
+    in one vectorized pass, and only reports that fail it are scanned again
+    to locate their problems, so checking many small reports stays fast.
+    """
+    results = [None] * len(report_paths)
+    rows, owners = [], []
+    for position, report_path in enumerate(report_paths):
+        if archive.is_archived(report_path):
+            results[position] = check_archived_report(
+                report_path, report_columns, optional_columns
+            )
+            continue
+        text, valid_utf8 = read_report_text(report_path)
+        report_rows = (
+            clean_rows(text, report_columns, optional_columns) if valid_utf8 else None
+        )
+        if report_rows is None:
+            results[position] = check_json_report(
+                report_path, report_columns, optional_columns
+            )
+            continue
+        rows.extend(report_rows)
+        owners.extend([position] * len(report_rows))
+        results[position] = {
+            "issues": [],
+            "expenses": len(report_rows),
+            "salvaged": None,
+        }
+
+    report_df = pd.DataFrame(rows, columns=report_columns, dtype=object)
+    owners = np.array(owners, dtype=np.int64)
+    invalid = validation.invalid_rows(report_df)
+    # invalid dates may not be strings, and their reports are rescanned anyway
+    dates = np.where(invalid, "", report_df["Date"].to_numpy(dtype=object))
+    out_of_order = (dates[1:] < dates[:-1]) & (owners[1:] == owners[:-1])
+    for position in np.union1d(owners[invalid], owners[1:][out_of_order]):
+        results[position] = check_json_report(
+            report_paths[position], report_columns, optional_columns
+        )
+    return results
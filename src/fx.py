@@ -0,0 +1,144 @@
+"""Module for the local FX rate table and vectorized currency conversion"""
+
+import os
+from decimal import Decimal
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src import caps
+from src import exceptions
+from src import file_utils
+
+
+RATE_COLUMNS = ["Date", "Currency", "Rate"]
+# rates set without a date apply to expenses on any date
+DEFAULT_RATE_DATE = "1900-01-01"
+# merge_asof needs both sides' dates at the same resolution
+RATE_DATE_DTYPE = "datetime64[ns]"
+
+
+@lru_cache(maxsize=8)
+def read_rates(rates_path: str, fingerprint: tuple[int, int]) -> pd.DataFrame:
+    """Read a rate table, cached until the file's fingerprint changes"""
+    rates = pd.read_csv(rates_path, dtype={"Currency": str, "Rate": str})
+    rates["Date"] = pd.to_datetime(rates["Date"], format="%Y-%m-%d").astype(
+        RATE_DATE_DTYPE
+    )
+    rates["Currency"] = rates["Currency"].astype(str)
+    rates["Rate"] = rates["Rate"].astype(float)
+    # merge_asof needs the table sorted by date
+    return rates.sort_values("Date", kind="stable").reset_index(drop=True)
+
+
+def load_rates(rates_path: str) -> pd.DataFrame:
+    """Load the rate table, or an empty table if the file does not exist"""
+    try:
+        fingerprint = tuple(file_utils.file_fingerprint(rates_path))
+    except FileNotFoundError:
+        return pd.DataFrame(
+            {
+                "Date": pd.Series(dtype=RATE_DATE_DTYPE),
+                "Currency": pd.Series(dtype=str),
+                "Rate": pd.Series(dtype=float),
+            }
+        )
+    return read_rates(rates_path, fingerprint)
+
+
+def set_rate(rates_path: str, currency: str, rate: str, date: str | None) -> None:
+    """Add or replace the rate for a currency from a date onwards"""
+    try:
+        rates = pd.read_csv(rates_path, dtype=str)
+    except FileNotFoundError:
+        rates = pd.DataFrame(columns=RATE_COLUMNS, dtype=str)
+
+    date = date or DEFAULT_RATE_DATE
+    same_key = (rates["Currency"] == currency) & (rates["Date"] == date)
+    rates = pd.concat(
+        [rates[~same_key], pd.DataFrame([[date, currency, rate]], columns=RATE_COLUMNS)],
+        ignore_index=True,
+    )
+    rates = rates.sort_values(["Currency", "Date"]).reset_index(drop=True)
+    os.makedirs(os.path.dirname(rates_path), exist_ok=True)
+    file_utils.write_file_atomically(rates.to_csv(index=False), rates_path)
+
+
+class CurrencyConverter:
+    """Converts expense amounts to the reporting currency using a rate table
+
+    Expenses without a currency code are already in the reporting currency.
+    Other expenses use the latest rate on or before their date, given as
+    reporting currency units per unit of the expense's currency.
+    """
+
+    def __init__(self, rates_path: str, reporting_currency: str = ""):
+        self.rates_path = rates_path
+        self.reporting_currency = reporting_currency
+
+    def __repr__(self) -> str:
+        return f"CurrencyConverter({self.rates_path!r}, {self.reporting_currency!r})"
+
+    def foreign_mask(self, currencies: pd.Series) -> np.ndarray:
+        """Return a mask of currency codes that need converting"""
+        codes = currencies.fillna("").to_numpy(dtype=object)
+        return (codes != "") & (codes != self.reporting_currency)
+
+    def convert_cents(
+        self, dates: pd.Series, currencies: pd.Series, cents: np.ndarray
+    ) -> np.ndarray:
+        """Convert amounts in cents to reporting currency cents with one rate join"""
+        converted = np.array(cents, dtype=np.int64)
+        foreign = self.foreign_mask(currencies)
+        if not foreign.any():
+            return converted
+
+        lookups = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(
+                    dates.to_numpy()[foreign], format="%Y-%m-%d"
+                ).astype(RATE_DATE_DTYPE),
+                "Currency": currencies.to_numpy(dtype=object)[foreign].astype(str),
+                "Position": np.flatnonzero(foreign),
+            }
+        ).sort_values("Date", kind="stable")
+        matched = pd.merge_asof(
+            lookups,
+            load_rates(self.rates_path),
+            on="Date",
+            by="Currency",
+            direction="backward",
+        )
+
+        missing = matched["Rate"].isna()
+        if missing.any():
+            first = matched[missing].iloc[0]
+            raise exceptions.MissingRateError(
+                f"Error: No {first['Currency']} exchange rate on or before "
+                f"{first['Date']:%Y-%m-%d}, set one with 'exptrack set-rate'"
+            )
+
+        positions = matched["Position"].to_numpy()
+        # round half up to whole cents
+        converted[positions] = np.floor(
+            converted[positions] * matched["Rate"].to_numpy() + 0.5
+        )
+        return converted
+
+    def convert_amounts(self, report_df: pd.DataFrame) -> list[Decimal]:
+        """Return a report df's Decimal amounts in the reporting currency"""
+        cents = caps.amounts_to_cents(report_df["Amount"])
+        return caps.cents_to_decimal(
+            self.convert_cents(report_df["Date"], report_df["Currency"], cents)
+        )
+
+    def total(self, report_df: pd.DataFrame) -> Decimal:
+        """Return a report df's total in the reporting currency"""
+        if not self.foreign_mask(report_df["Currency"]).any():
+            return report_df["Amount"].sum()
+        return sum(self.convert_amounts(report_df), Decimal("0.00"))
+
+    def with_converted_amounts(self, report_df: pd.DataFrame) -> pd.DataFrame:
+        """Add a Converted Amount column if any expense is in another currency"""
+        if self.foreign_mask(report_df["Currency"]).any():
+            report_df["Converted Amount"] = self.convert_amounts(report_df)
+        return report_df
@@ -0,0 +1,341 @@
+"""Module for the per-report journal of changes used by undo, redo and history"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Callable, Iterator
+from src import archive
+from src import exceptions
+from src import file_utils
+from src import recurrence
+
+
+JOURNAL_DIR_NAME = ".journal"
+# changes journaled per segment before a new snapshot is taken
+SNAPSHOT_INTERVAL = 100
+# segments kept, older history is dropped
+KEEP_SEGMENTS = 5
+# bytes read at a time when scanning a segment back from its end
+TAIL_CHUNK_SIZE = 64 * 1024
+CHANGE_OPS = {"create", "add", "remove", "delete"}
+INVERSE_OPS = {"create": "delete", "add": "remove", "remove": "add", "delete": "create"}
+
+
+def journal_dir(report_path: str) -> str:
+    """Return the hidden directory holding a report's journal"""
+    name = os.path.basename(report_path).removesuffix(".json")
+    return os.path.join(os.path.dirname(report_path), JOURNAL_DIR_NAME, name)
+
+
+def segment_path(report_path: str, segment: int) -> str:
+    """Return the path of a journal segment's change log"""
+    return os.path.join(journal_dir(report_path), f"{segment:06d}.jsonl")
+
+
+def snapshot_path(report_path: str, segment: int) -> str:
+    """Return the path of the report snapshot a journal segment starts from"""
+    return os.path.join(journal_dir(report_path), f"{segment:06d}.snapshot.json")
+
+
+def state_path(report_path: str, segment: int) -> str:
+    """Return the path of the state kept for a journal segment's last record"""
+    return os.path.join(journal_dir(report_path), f"{segment:06d}.state.json")
+
+
+def has_journal(report_path: str) -> bool:
+    """Check if a report has journaled changes"""
+    return bool(segments(report_path))
+
+
+def segments(report_path: str) -> list[int]:
+    """Return the numbers of a report's journal segments, oldest first"""
+    try:
+        filenames = os.listdir(journal_dir(report_path))
+    except FileNotFoundError:
+        return []
+    return sorted(
+        int(filename.removesuffix(".jsonl"))
+        for filename in filenames
+        if filename.endswith(".jsonl")
+    )
+
+
+def current_fingerprint(report_path: str) -> list[int] | None:
+    """Return the report's fingerprint, or None if it does not exist"""
+    try:
+        return archive.report_fingerprint(report_path)
+    except FileNotFoundError:
+        return None
+
+
+def read_segment(report_path: str, segment: int) -> list[dict]:
+    """Read the records of a journal segment, tagging each with its segment"""
+    records = []
+    with open(segment_path(report_path, segment), "r") as segment_file:
+        for line in segment_file:
+            # a torn final line from an interrupted append is ignored
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            record["segment"] = segment
+            records.append(record)
+    return records
+
+
+def reversed_lines(segment_file) -> Iterator[bytes]:
+    """Yield the lines of a binary file from last to first, reading back from its end"""
+    end = segment_file.seek(0, os.SEEK_END)
+    # pieces of the line being read, the last piece first
+    pieces = []
+    while end > 0:
+        start = max(0, end - TAIL_CHUNK_SIZE)
+        segment_file.seek(start)
+        chunk = segment_file.read(end - start)
+        end, stop = start, len(chunk)
+        # only the new chunk is searched, so each byte is read once
+        while (newline := chunk.rfind(b"\n", 0, stop)) != -1:
+            pieces.append(chunk[newline + 1 : stop])
+            yield b"".join(reversed(pieces))
+            pieces, stop = [], newline
+        pieces.append(chunk[:stop])
+    yield b"".join(reversed(pieces))
+
+
+def read_last_record(report_path: str, segment: int) -> dict | None:
+    """Read the last record of a journal segment, scanning back from its end"""
+    with open(segment_path(report_path, segment), "rb") as segment_file:
+        for line in reversed_lines(segment_file):
+            # a torn final line from an interrupted append is ignored
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            record["segment"] = segment
+            return record
+    return None
+
+
+def count_records(report_path: str, segment: int) -> int:
+    """Count the records of a journal segment without decoding them"""
+    with open(segment_path(report_path, segment), "rb") as segment_file:
+        return sum(
+            chunk.count(b"\n")
+            for chunk in iter(lambda: segment_file.read(TAIL_CHUNK_SIZE), b"")
+        )
+
+
+def segment_state(report_path: str, segment: int) -> dict:
+    """Return the seq and fingerprint of a segment's last record and its record count
+
+    They are read from the segment's state file, so a change never decodes
+    the segment's last line, which holds every row of a bulk add. The segment
+    is scanned instead if its state file is missing or was not updated for
+    its last append, e.g. after a crash.
+    """
+    size = os.path.getsize(segment_path(report_path, segment))
+    try:
+        with open(state_path(report_path, segment), "r") as state_file:
+            state = json.load(state_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = None
+    if state is not None and state.get("size") == size:
+        return state
+
+    last = read_last_record(report_path, segment)
+    return {
+        "seq": None if last is None else last["seq"],
+        "fingerprint": None if last is None else last["fingerprint"],
+        "records": 0 if last is None else count_records(report_path, segment),
+        "size": size,
+    }
+
+
+def load_records(report_path: str) -> list[dict]:
+    """Read all retained journal records of a report, oldest first"""
+    records = []
+    for segment in segments(report_path):
+        records.extend(read_segment(report_path, segment))
+    return records
+
+
+def write_record(
+    report_path: str, segment: int, record: dict, records: int
+) -> None:
+    """Append a record to a journal segment, the segment's records-th record"""
+    with open(segment_path(report_path, segment), "a") as segment_file:
+        segment_file.write(json.dumps(record) + "\n")
+        segment_file.flush()
+        os.fsync(segment_file.fileno())
+        size = segment_file.tell()
+    state = {
+        "seq": record["seq"],
+        "fingerprint": record["fingerprint"],
+        "records": records,
+        "size": size,
+    }
+    file_utils.write_file_atomically(
+        json.dumps(state), state_path(report_path, segment)
+    )
+
+
+def start_segment(
+    report_path: str,
+    snapshot: Callable[[], str | None],
+    last_seq: int,
+    segment: int,
+) -> None:
+    """Start a journal segment from a snapshot of the report's stored data"""
+    os.makedirs(journal_dir(report_path), exist_ok=True)
+    snapshot_data = snapshot()
+    if snapshot_data is not None:
+        file_utils.write_file_atomically(
+            snapshot_data, snapshot_path(report_path, segment)
+        )
+    write_record(
+        report_path,
+        segment,
+        {
+            "seq": last_seq,
+            "op": "segment",
+            "fingerprint": current_fingerprint(report_path),
+        },
+        1,
+    )
+
+    for old_segment in segments(report_path)[:-KEEP_SEGMENTS]:
+        os.remove(segment_path(report_path, old_segment))
+        for path in [snapshot_path, state_path]:
+            try:
+                os.remove(path(report_path, old_segment))
+            except FileNotFoundError:
+                pass
+
+
+def read_snapshot(report_path: str, segment: int) -> str:
+    """Read the report snapshot a journal segment starts from"""
+    with open(snapshot_path(report_path, segment), "r") as snapshot_file:
+        return snapshot_file.read()
+
+
+def clear(report_path: str) -> None:
+    """Delete a report's journal"""
+    shutil.rmtree(journal_dir(report_path), ignore_errors=True)
+
+
+def in_sync(report_path: str) -> bool:
+    """Check if a report is journaled and unchanged since its last record"""
+    report_segments = segments(report_path)
+    if not report_segments:
+        return False
+    try:
+        state = segment_state(report_path, report_segments[-1])
+    except FileNotFoundError:
+        return False
+    return state["records"] > 0 and state["fingerprint"] == current_fingerprint(
+        report_path
+    )
+
+
+def begin_change(
+    report_path: str, op: str, snapshot: Callable[[], str | None]
+) -> None:
+    """Prepare the journal before a change is made to the report
+
+    A new segment starting from a snapshot is begun every SNAPSHOT_INTERVAL
+    changes and before a report is deleted, so deletions can be undone.
+    History is discarded if the report was changed outside the journal.
+    """
+    report_segments = segments(report_path)
+    if not report_segments:
+        start_segment(report_path, snapshot, 0, 0)
+        return
+
+    try:
+        state = segment_state(report_path, report_segments[-1])
+    except FileNotFoundError:
+        state = {"seq": None, "records": 0}
+    last_seq = state["seq"] if state["records"] else 0
+    if not in_sync(report_path):
+        clear(report_path)
+        start_segment(report_path, snapshot, last_seq, 0)
+    elif op == "delete" or state["records"] > SNAPSHOT_INTERVAL:
+        start_segment(report_path, snapshot, last_seq, report_segments[-1] + 1)
+
+
+def last_state(report_path: str) -> tuple[int, dict]:
+    """Return the last journal segment and the state of its last record
+
+    Raises JournalError if the journal was cleared while a change was made.
+    """
+    report_segments = segments(report_path)
+    try:
+        segment = report_segments[-1]
+        state = segment_state(report_path, segment)
+    except (IndexError, FileNotFoundError):
+        state = {"records": 0}
+    if not state["records"]:
+        raise exceptions.JournalError(
+            "Error: Report's history was cleared while it was being changed"
+        )
+    return segment, state
+
+
+def append(report_path: str, record: dict) -> dict:
+    """Journal a change made to the report, stamped with the report's new state"""
+    segment, state = last_state(report_path)
+    record = {
+        "seq": state["seq"] + 1,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        **record,
+        "fingerprint": current_fingerprint(report_path),
+    }
+    write_record(report_path, segment, record, state["records"] + 1)
+    return record
+
+
+def is_top(changes: list[dict], seq: int) -> bool:
+    """Check if the change with the given seq is last in a stack of changes"""
+    return bool(changes) and changes[-1]["seq"] == seq
+
+
+def replay(records: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Return the applied changes and the undone changes that can be redone"""
+    applied, undone = [], []
+    for record in records:
+        if record["op"] in CHANGE_OPS:
+            applied.append(record)
+            # a new change discards the undone changes, as in an editor
+            undone = []
+        # targets in segments that have since been dropped are skipped
+        elif record["op"] == "undo" and is_top(applied, record["target"]):
+            undone.append(applied.pop())
+        elif record["op"] == "redo" and is_top(undone, record["target"]):
+            applied.append(undone.pop())
+    return applied, undone
+
+
+def check_unchanged(report_path: str, records: list[dict]) -> None:
+    """Raise JournalConflictError if the report changed outside the journal"""
+    if records and records[-1]["fingerprint"] != current_fingerprint(report_path):
+        raise exceptions.JournalConflictError(
+            "Error: Report was changed outside expense-tracker-cli "
+            "since its last journaled change, its history can't be applied"
+        )
+
+
+def describe(record: dict) -> str:
+    """Return a short description of a journaled change"""
+    count = len(record.get("rows", []))
+    plural = "" if count == 1 else "s"
+    added = f"Added {count} expense{plural}"
+    if "rule" in record:
+        added = f"{added} recurring {recurrence.describe_rule(record['rule'])}"
+    descriptions = {
+        "create": "Created report",
+        "add": added,
+        "remove": f"Removed expense ID {record.get('positions', [0])[0] + 1}",
+        "delete": "Deleted report",
+    }
+    return descriptions[record["op"]]
@@ -1,10 +1,12 @@
 """Main module"""
 
-import os
 import sys
 from rich.console import Console
+from src import api
 from src import cli_args
 from src import config_manager
+from src import exceptions
+from src import fx
 from src import utils
 from src import commands
 
@@ -17,48 +19,130 @@ def main():
 
         args = cli_args.parse_arguments()
         storage_directory = utils.init_storage_directory()
-        # Sets report's name, filename and path if a sub-command that interacts
-        # with a file is used
+        # Sets report's name if a sub-command that interacts with a file is used
         try:
-            report_filename = args.filename
             # Report name = report file name without .json extension
-            report_name = report_filename.split(".")[0]
-            report_path = os.path.join(storage_directory, report_filename)
+            report_name = args.filename.split(".")[0]
         except AttributeError:
             pass
 
         config = config_manager.init_config()
         max_claimable_amount = config_manager.init_max_claimable_amount(config, console)
         currency = config_manager.init_currency(config, console)
+        store = api.ExpenseStore(
+            storage_directory,
+            fx.CurrencyConverter(
+                config_manager.AppInfo.rates_path,
+                config_manager.init_reporting_currency(config),
+            ),
+        )
 
         command_dict = {
-            "create": lambda: commands.create_new_report(
-                storage_directory, report_name, console
-            ),
+            "create": lambda: commands.create_new_report(store, report_name, console),
             "display": lambda: commands.display_summary(
-                report_path, report_name, max_claimable_amount, currency, console
+                store,
+                report_name,
+                config_manager.resolve_cap_policy(max_claimable_amount, report_name),
+                currency,
+                console,
+                args.by,
             )
             if args.summary
-            else commands.display_report(report_path, report_name, currency, console),
-            "update": lambda: commands.add_new_report_entry(report_path),
-            "ls": lambda: commands.list_reports(storage_directory, console),
-            "rm": lambda: commands.handle_rm_row(args.id, report_path, console)
+            else commands.display_report(store, report_name, currency, console),
+            "update": lambda: commands.add_new_report_entry(
+                store,
+                report_name,
+                console,
+                args.every,
+                args.interval,
+                args.until,
+                args.count,
+            ),
+            "ls": lambda: commands.list_reports(store, console),
+            "search": lambda: commands.search_reports(
+                store, args.query, args.reports or None, currency, console
+            ),
+            "rm": lambda: commands.handle_rm_row(store, args.id, report_name, console)
             if args.id
-            else commands.delete_report(report_path, report_name, console),
-            "export": lambda: commands.export_report_to_xlsx(
-                report_name, report_path, max_claimable_amount, currency, console
+            else commands.delete_report(store, report_name, console),
+            "export": lambda: commands.export_report(
+                store,
+                report_name,
+                config_manager.resolve_cap_policy(max_claimable_amount, report_name),
+                currency,
+                args.format,
+                console,
+                args.output,
+                args.by,
             ),
             "set-max": lambda: commands.set_config_setting(
                 config, "max_claimable_amount", args.max_claimable_amount, console
             ),
+            "set-cap": lambda: commands.set_cap(
+                config,
+                args.period,
+                args.amount,
+                args.category,
+                args.report.split(".")[0] if args.report else None,
+                console,
+            ),
             "set-currency": lambda: commands.set_config_setting(
                 config, "currency", args.currency, console
             ),
+            "set-reporting-currency": lambda: commands.set_config_setting(
+                config, "reporting_currency", args.reporting_currency, console
+            ),
+            "set-rate": lambda: commands.set_rate(
+                args.currency_code, args.rate, args.date, console
+            ),
+            "migrate": lambda: commands.migrate_reports(
+                store,
+                store.report_names() if args.all else [report_name],
+                args.workers,
+                console,
+            ),
+            "fsck": lambda: commands.check_reports(
+                store,
+                store.report_names() if args.all else [report_name],
+                args.repair,
+                args.workers,
+                console,
+            ),
+            "archive": lambda: commands.archive_report(
+                store, report_name, args.compression, console
+            ),
+            "undo": lambda: commands.undo_change(store, report_name, console),
+            "redo": lambda: commands.redo_change(store, report_name, console),
+            "history": lambda: commands.display_history(store, report_name, console),
+            "generate": lambda: commands.generate_reports(
+                store,
+                args.prefix,
+                args.reports,
+                args.expenses,
+                args.start,
+                args.end,
+                args.seed,
+                console,
+            ),
+            "loadtest": lambda: commands.run_load_test(
+                store,
+                args.prefix,
+                args.processes,
+                args.operations,
+                args.mix,
+                config_manager.resolve_cap_policy(max_claimable_amount),
+                args.seed,
+                console,
+            ),
             "view-config": lambda: commands.view_config(config, console),
         }
 
         command_dict[args.command]()
 
+    except exceptions.ExpenseTrackerError as e:
+        console.print(f"[{utils.Colours.error}]{e}")
+        sys.exit(1)
+
     except KeyboardInterrupt:
         print()
         sys.exit()
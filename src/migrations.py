@@ -0,0 +1,45 @@
+"""Module for report file schema versions and migrations between them"""
+
+from src import exceptions
+
+
+REPORT_SCHEMA_VERSION = 2
+LEGACY_SCHEMA_VERSION = 1
+
+
+def detect_version(report: dict) -> int:
+    """Return the schema version of raw report file data"""
+    # version 1 reports are a bare pandas column dict with no header
+    return report.get("schema_version", LEGACY_SCHEMA_VERSION)
+
+
+def upgrade_v1_to_v2(report: dict) -> dict:
+    """Convert a pandas column dict keyed by row index to a header plus rows"""
+    columns = list(report)
+    row_keys = list(report[columns[0]]) if columns else []
+    data = [[report[col].get(key) for col in columns] for key in row_keys]
+    return {"schema_version": 2, "columns": columns, "data": data}
+
+
+MIGRATIONS = {
+    1: upgrade_v1_to_v2,
+}
+
+
+def needs_migration(report: dict) -> bool:
+    """Check if raw report file data is older than the current schema"""
+    return detect_version(report) < REPORT_SCHEMA_VERSION
+
+
+def migrate(report: dict) -> dict:
+    """Upgrade raw report file data to the current schema version"""
+    version = detect_version(report)
+    if version > REPORT_SCHEMA_VERSION:
+        raise exceptions.UnsupportedSchemaError(
+            f"Error: Report schema version {version} is newer than supported "
+            f"version {REPORT_SCHEMA_VERSION}, upgrade expense-tracker-cli"
+        )
+    while version < REPORT_SCHEMA_VERSION:
+        report = MIGRATIONS[version](report)
+        version = detect_version(report)
+    return report
@@ -0,0 +1,61 @@
+"""Module for expanding recurring expenses into the dates they occur on"""
+
+import numpy as np
+
+
+FREQUENCIES = ["day", "weekday", "week", "month", "year"]
+# shortest gap in days between occurrences, bounding how many dates are
+# generated before those after the end date are dropped
+MIN_GAP_DAYS = {"day": 1, "weekday": 1, "week": 7, "month": 28, "year": 365}
+DAYS_PER_STEP = {"day": 1, "week": 7}
+MONTHS_PER_STEP = {"month": 1, "year": 12}
+
+
+def is_weekday(date: str) -> bool:
+    """Check if a yyyy-mm-dd date is a Monday to Friday"""
+    return bool(np.is_busday(np.datetime64(date, "D")))
+
+
+def occurrence_dates(
+    start: str,
+    frequency: str,
+    interval: int = 1,
+    until: str | None = None,
+    count: int | None = None,
+) -> list[str]:
+    """Return the yyyy-mm-dd dates of a recurring expense, from its start date
+
+    Dates are generated up to and including until, or count dates if given.
+    Monthly and yearly dates keep the start's day of the month, moved back
+    to the last day of shorter months, and weekday dates skip weekends.
+    """
+    first = np.datetime64(start, "D")
+    if count is None:
+        days = (np.datetime64(until, "D") - first).astype(int)
+        count = max(0, days // (MIN_GAP_DAYS[frequency] * interval) + 1)
+    steps = np.arange(count) * interval
+
+    if frequency in DAYS_PER_STEP:
+        dates = first + steps * DAYS_PER_STEP[frequency]
+    elif frequency == "weekday":
+        dates = np.busday_offset(first, steps, roll="forward")
+    else:
+        first_month = first.astype("datetime64[M]")
+        months = first_month + steps * MONTHS_PER_STEP[frequency]
+        month_starts = months.astype("datetime64[D]")
+        month_lengths = ((months + 1).astype("datetime64[D]") - month_starts).astype(int)
+        day = (first - first_month.astype("datetime64[D]")).astype(int)
+        dates = month_starts + np.minimum(day, month_lengths - 1)
+
+    if until is not None:
+        dates = dates[dates <= np.datetime64(until, "D")]
+    return np.datetime_as_string(dates, unit="D").tolist()
+
+
+def describe_rule(rule: dict) -> str:
+    """Return a short description of a recurrence rule"""
+    interval, frequency = rule["interval"], rule["every"]
+    every = f"every {frequency}" if interval == 1 else f"every {interval} {frequency}s"
+    if rule.get("until") is not None:
+        return f"{every} until {rule['until']}"
+    return f"{every}, {rule['count']} times"
@@ -0,0 +1,285 @@
+"""Module for the inverted index used to search expense descriptions"""
+
+import io
+import json
+import os
+import re
+import shutil
+from bisect import bisect_left
+from itertools import compress
+import numpy as np
+import pandas as pd
+from src import archive
+from src import file_utils
+
+
+INDEX_DIR_NAME = ".index"
+TOKEN_FORMAT = r"\w+"
+TOKEN_PATTERN = re.compile(TOKEN_FORMAT)
+# sorts after any character a token can hold, bounding the tokens with a prefix
+LAST_CHARACTER = chr(0x10FFFF)
+META_FILE_NAME = "meta.json"
+# each saved as .npy so searches can memory-map them: the newline separated
+# UTF-8 terms, where each term starts in them, where each term's postings
+# start in rows, and where each row starts in the report file
+ARRAY_NAMES = ["terms", "term_offsets", "offsets", "rows", "row_offsets"]
+
+
+class TermList:
+    """Sorted index terms decoded one at a time from memory-mapped arrays
+
+    Supports len and indexing, so bisecting it reads only the terms compared.
+    """
+
+    def __init__(self, terms: np.ndarray, term_offsets: np.ndarray):
+        self.terms = terms
+        self.term_offsets = term_offsets
+
+    def __len__(self) -> int:
+        return len(self.term_offsets) - 1
+
+    def __getitem__(self, position: int) -> str:
+        start, end = self.term_offsets[position : position + 2]
+        # each term is followed by a newline, or by nothing if it is the last
+        return self.terms[start : end - 1].tobytes().decode()
+
+
+def index_dir(report_path: str) -> str:
+    """Return the hidden directory holding search indexes for a report's directory"""
+    return os.path.join(os.path.dirname(report_path), INDEX_DIR_NAME)
+
+
+def index_path(report_path: str) -> str:
+    """Return the directory holding the search index kept for a report"""
+    name = os.path.basename(report_path).removesuffix(".json")
+    return os.path.join(index_dir(report_path), name)
+
+
+def array_path(report_path: str, name: str) -> str:
+    """Return the path of one of the arrays making up a report's search index"""
+    return os.path.join(index_path(report_path), f"{name}.npy")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def postings_offsets(owners: np.ndarray, term_count: int) -> np.ndarray:
+    """Return where each term's postings start, and the end of the last term's
+
+    owners holds the term of each posting, with postings grouped by term.
+    """
+    counts = np.bincount(owners, minlength=term_count)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def term_offsets(terms: bytes, term_count: int) -> np.ndarray:
+    """Return where each newline separated term starts, and one past the last's end"""
+    if not term_count:
+        return np.zeros(1, dtype=np.int64)
+    newlines = np.flatnonzero(np.frombuffer(terms, dtype=np.uint8) == ord("\n"))
+    return np.concatenate([[0], newlines + 1, [len(terms) + 1]]).astype(np.int64)
+
+
+def build_index(report_df: pd.DataFrame) -> dict:
+    """Map each description token to the ascending 0-based rows containing it
+
+    terms are sorted, and the rows of terms[i] are rows[offsets[i]:offsets[i + 1]].
+    """
+    tokens = (
+        report_df["Description"]
+        .astype(object)
+        .fillna("")
+        .str.lower()
+        .str.findall(TOKEN_FORMAT)
+        .reset_index(drop=True)
+        .explode()
+        .dropna()
+    )
+    postings = pd.DataFrame(
+        {"term": tokens.to_numpy(), "row": tokens.index.to_numpy()}
+    ).drop_duplicates()
+    owners, terms = pd.factorize(postings["term"], sort=True)
+    rows = postings["row"].to_numpy(dtype=np.int64)
+    return {
+        "terms": terms.tolist(),
+        "offsets": postings_offsets(owners, len(terms)),
+        "rows": rows[np.lexsort((rows, owners))],
+    }
+
+
+def insert_postings(
+    terms: list[str],
+    owners: np.ndarray,
+    rows: np.ndarray,
+    positions: list[int],
+    descriptions: list[str],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return postings with the tokens of inserted rows added, as owners and rows
+
+    Terms new to the index are inserted into terms in place, in sorted order.
+    Postings stay grouped by term and ascending within each term.
+    """
+    added = {
+        (token, position)
+        for position, description in zip(positions, descriptions)
+        for token in tokenize(description or "")
+    }
+    new_terms = []
+    for token in sorted({token for token, _ in added}):
+        position = bisect_left(terms, token)
+        if position == len(terms) or terms[position] != token:
+            new_terms.append((position, token))
+    # existing terms move down by the new terms inserted before them
+    inserted_at = np.array([position for position, _ in new_terms], dtype=np.int64)
+    owners = owners + np.searchsorted(inserted_at, owners, side="right")
+    for position, token in reversed(new_terms):
+        terms.insert(position, token)
+
+    pairs = sorted((bisect_left(terms, token), position) for token, position in added)
+    new_owners, new_rows = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+    # a key ordering postings by term and then row finds where each one goes
+    stride = max(rows.max(initial=-1), new_rows.max(initial=-1)) + 1
+    at = np.searchsorted(owners * stride + rows, new_owners * stride + new_rows)
+    return np.insert(owners, at, new_owners), np.insert(rows, at, new_rows)
+
+
+def update_index(
+    index: dict, positions: list[int], descriptions: list[str], sign: int
+) -> dict:
+    """Apply rows inserted (sign=1) or removed (sign=-1) to an index in place
+
+    descriptions are those of the rows at the ascending 0-based positions,
+    so only the changed rows are tokenized rather than the whole report.
+    positions are rows of the report with the rows inserted, or without
+    them removed. Later rows move up or down by the changed rows before them.
+    """
+    terms, rows = index["terms"], index["rows"]
+    owners = np.repeat(np.arange(len(terms)), np.diff(index["offsets"]))
+    changed = np.asarray(positions, dtype=np.int64)
+    if sign > 0:
+        # the nth inserted row comes before the rows from its position - n on
+        rows = rows + np.searchsorted(
+            changed - np.arange(len(changed)), rows, side="right"
+        )
+        owners, rows = insert_postings(terms, owners, rows, positions, descriptions)
+    else:
+        kept = ~np.isin(rows, changed)
+        rows, owners = rows[kept], owners[kept]
+        rows -= np.searchsorted(changed, rows)
+        # terms left without rows are dropped, moving later terms up
+        empty = np.bincount(owners, minlength=len(terms)) == 0
+        terms = list(compress(terms, ~empty))
+        owners -= np.cumsum(empty)[owners]
+
+    index.update(terms=terms, offsets=postings_offsets(owners, len(terms)), rows=rows)
+    return index
+
+
+def load_index(report_path: str, mmap_mode: str | None = None) -> dict | None:
+    """Load a report's search index if it exists and matches the report file
+
+    With mmap_mode "r" its arrays are memory-mapped, so a search reads only
+    the terms it bisects and the postings it matches, and terms is a TermList.
+    row_offsets is None unless the index was saved with them.
+    """
+    try:
+        with open(
+            os.path.join(index_path(report_path), META_FILE_NAME), "r"
+        ) as meta_file:
+            meta = json.load(meta_file)
+        if meta.get("fingerprint") != archive.report_fingerprint(report_path):
+            return None
+        index = {
+            name: np.load(array_path(report_path, name), mmap_mode=mmap_mode)
+            for name in ARRAY_NAMES
+            if name in meta["arrays"]
+        }
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
+        return None
+
+    offsets = index.pop("term_offsets")
+    if mmap_mode is None:
+        terms = index["terms"].tobytes().decode()
+        index["terms"] = terms.split("\n") if len(offsets) > 1 else []
+    else:
+        index["terms"] = TermList(index["terms"], offsets)
+    index.setdefault("row_offsets", None)
+    return index
+
+
+def array_bytes(array: np.ndarray) -> bytes:
+    """Return an array serialised in the .npy format"""
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def save_index(
+    index: dict,
+    report_path: str,
+    fingerprint: list[int] | None = None,
+    row_offsets: np.ndarray | None = None,
+) -> None:
+    """Save a search index, stamped with the given or current report fingerprint
+
+    row_offsets, where each row starts in a JSON report's file, let searches
+    read only the matching rows. Archives and unsplittable reports have none.
+    """
+    if fingerprint is None:
+        fingerprint = archive.report_fingerprint(report_path)
+    meta_path = os.path.join(index_path(report_path), META_FILE_NAME)
+    os.makedirs(index_path(report_path), exist_ok=True)
+    # unstamped while its arrays are replaced, so a partial save reads as stale
+    try:
+        os.remove(meta_path)
+    except FileNotFoundError:
+        pass
+    terms = "\n".join(index["terms"]).encode()
+    arrays = {
+        "terms": np.frombuffer(terms, dtype=np.uint8),
+        "term_offsets": term_offsets(terms, len(index["terms"])),
+        "offsets": index["offsets"],
+        "rows": index["rows"].astype(np.int32),
+        "row_offsets": row_offsets,
+    }
+    arrays = {name: array for name, array in arrays.items() if array is not None}
+    for name, array in arrays.items():
+        file_utils.write_file_atomically(
+            array_bytes(array), array_path(report_path, name)
+        )
+    file_utils.write_file_atomically(
+        json.dumps({"fingerprint": fingerprint, "arrays": list(arrays)}), meta_path
+    )
+
+
+def remove_index(report_path: str) -> None:
+    """Delete a report's search index"""
+    try:
+        shutil.rmtree(index_path(report_path))
+    except FileNotFoundError:
+        pass
+
+
+def prefix_matches(index: dict, prefix: str) -> np.ndarray:
+    """Return the ascending rows containing any token starting with the prefix"""
+    terms, offsets = index["terms"], index["offsets"]
+    # terms are sorted, so tokens sharing a prefix are contiguous
+    start = bisect_left(terms, prefix)
+    end = bisect_left(terms, prefix + LAST_CHARACTER, start)
+    return np.unique(index["rows"][offsets[start] : offsets[end]])
+
+
+def search_index(index: dict, query: str) -> list[int]:
+    """Return sorted 0-based rows matching every query term as a prefix"""
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    rows = prefix_matches(index, terms[0])
+    for term in terms[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, prefix_matches(index, term), assume_unique=True)
+    return rows.tolist()
@@ -9,6 +9,9 @@ from pydantic import BaseModel
 
 
 VALID_MONEY_FORMAT = r"^\d+(\.\d{2})?$"
+VALID_MONEY_PATTERN = re.compile(VALID_MONEY_FORMAT)
+VALID_CURRENCY_CODE_FORMAT = r"^[A-Z]{3}$"
+VALID_CURRENCY_CODE_PATTERN = re.compile(VALID_CURRENCY_CODE_FORMAT)
 VALID_DATE_FORMAT = "%Y-%m-%d"
 VALID_CURRENCIES = {
     "د.ج",
@@ -79,7 +82,7 @@ def is_valid_date(date_str: str) -> bool:
 
 def is_valid_monetary_value(value_str: str) -> bool:
     """Validate monetary value format (integer or 2 decimal places)"""
-    return re.match(VALID_MONEY_FORMAT, value_str) is not None
+    return VALID_MONEY_PATTERN.match(value_str) is not None
 
 
 def is_valid_currency(currency: str) -> bool:
@@ -87,6 +90,11 @@ def is_valid_currency(currency: str) -> bool:
     return currency in VALID_CURRENCIES
 
 
+def is_valid_currency_code(code: str) -> bool:
+    """Validate a 3 letter ISO 4217 currency code, or blank for none"""
+    return code == "" or VALID_CURRENCY_CODE_PATTERN.match(code) is not None
+
+
 def prompt_for_max_claimable_amount() -> str:
     """Prompt for maximum daily claimable amount"""
     while True:
@@ -140,10 +148,27 @@ def prompt_for_expense_description() -> str:
             return description
 
 
+def prompt_for_expense_category() -> str:
+    """Prompt for optional expense category used for category caps"""
+    print("Enter expense category (blank for none)")
+    return input("Category: ").strip()
+
+
+def prompt_for_expense_currency() -> str:
+    """Prompt for optional currency code of an expense in a foreign currency"""
+    while True:
+        print("Enter currency code e.g. USD (blank for the reporting currency)")
+        code = input("Currency: ").strip().upper()
+        if is_valid_currency_code(code):
+            return code
+
+
 class ReportDataTemplate(BaseModel):
     Date: str
     Amount: str
     Description: str
+    Category: str = ""
+    Currency: str = ""
 
 
 def get_report_data() -> dict[str, str]:
@@ -152,6 +177,8 @@ def get_report_data() -> dict[str, str]:
         Date=get_date_for_report(),
         Amount=prompt_for_expense_cost(),
         Description=prompt_for_expense_description(),
+        Category=prompt_for_expense_category(),
+        Currency=prompt_for_expense_currency(),
     )
     return report_data.model_dump()
 
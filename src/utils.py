@@ -3,11 +3,31 @@
 import os
 import sys
 import json
+from contextlib import AbstractContextManager
+from decimal import Decimal
+import numpy as np
 import pandas as pd
 from rich.table import Table
 from rich.console import Console
 from src import config_manager
 from src import user_input
+from src import aggregates
+from src import archive
+from src import caps
+from src import exceptions
+from src import file_utils
+from src import fsck
+from src import fx
+from src import journal
+from src import migrations
+from src import search
+from src import validation
+
+
+REPORT_COLUMNS = ["Date", "Amount", "Description", "Category", "Currency"]
+OPTIONAL_COLUMNS = {"Category": "", "Currency": ""}
+LOCK_DIR_NAME = ".locks"
+ROW_DECODER = json.JSONDecoder()
 
 
 def handle_missing_subcommand(console: Console) -> None:
@@ -24,8 +44,39 @@ def init_storage_directory() -> str:
     return storage_directory
 
 
-def load_expense_report(report_path: str) -> dict[str, str] | None:
-    """Load the expense report"""
+def list_report_paths(storage_directory: str) -> list[str]:
+    """Return the paths of all expense reports in the reports directory"""
+    report_names = {
+        # archived reports are listed by the path they had as JSON reports
+        filename.removesuffix(archive.ARCHIVE_EXTENSION).removesuffix(".json")
+        for filename in os.listdir(storage_directory)
+        # skip hidden temporary files left by interrupted saves
+        if filename.endswith((".json", archive.ARCHIVE_EXTENSION))
+        and not filename.startswith(".")
+    }
+    return sorted(
+        os.path.join(storage_directory, f"{name}.json") for name in report_names
+    )
+
+
+def report_lock(report_path: str) -> AbstractContextManager[None]:
+    """Return a lock held while a report and its journal are changed
+
+    Changes from other processes wait for it, so none of them are lost.
+    """
+    name = os.path.basename(report_path).removesuffix(".json")
+    return file_utils.locked(
+        os.path.join(os.path.dirname(report_path), LOCK_DIR_NAME, f"{name}.lock")
+    )
+
+
+def report_exists(report_path: str) -> bool:
+    """Check if a report exists as a JSON file or an archive"""
+    return os.path.exists(report_path) or archive.is_archived(report_path)
+
+
+def load_raw_expense_report(report_path: str) -> dict | None:
+    """Load the expense report file data as stored, without migrating it"""
     try:
         with open(report_path, "r") as expense_report:
             return json.load(expense_report)
@@ -33,10 +84,231 @@ def load_expense_report(report_path: str) -> dict[str, str] | None:
         return None
 
 
+def load_expense_report(report_path: str) -> dict | None:
+    """Load the expense report, upgrading older schema versions in memory"""
+    report = load_raw_expense_report(report_path)
+    if report is None:
+        return None
+    return migrations.migrate(report)
+
+
+def report_to_df(report: dict) -> pd.DataFrame:
+    """Convert current schema report data to a df of string values"""
+    report_df = pd.DataFrame(report["data"], columns=report["columns"], dtype=object)
+    return add_missing_columns(report_df)
+
+
+def load_report_df(report_path: str) -> pd.DataFrame | None:
+    """Load the expense report as a df of string values"""
+    if archive.is_archived(report_path):
+        return add_missing_columns(archive.read_archive(report_path))
+    report = load_expense_report(report_path)
+    if report is None:
+        return None
+    return report_to_df(report)
+
+
+def report_text(columns: list[str], row_lines: list[str]) -> str:
+    """Return report file JSON with the current schema version header
+
+    Each row is serialised on its own line, so rows can be inserted and
+    removed without parsing or reserialising the rest of the report.
+    """
+    header = json.dumps(
+        {"schema_version": migrations.REPORT_SCHEMA_VERSION, "columns": columns}
+    )
+    data = [",\n".join(row_lines)] if row_lines else []
+    return "\n".join([f'{header[:-1]}, "data": [', *data, "]}"])
+
+
+def report_json(report: pd.DataFrame) -> str:
+    """Serialise a report df to JSON with the current schema version header"""
+    rows = report.astype(object).values.tolist()
+    return report_text(list(report.columns), [json.dumps(row) for row in rows])
+
+
 def save_expense_report(report: pd.DataFrame, report_path: str) -> None:
-    """Save expense report"""
-    with open(report_path, "w") as report_file:
-        report.to_json(report_file, indent=4)
+    """Save expense report with the current schema version header"""
+    file_utils.write_file_atomically(report_json(report), report_path)
+
+
+def split_report_text(text: str) -> list[str] | None:
+    """Split report file text into its serialised row lines
+
+    Returns None unless the report has the current columns and every line
+    between its header and footer holds exactly one row.
+    """
+    header_end, data_end = text.find("\n"), text.rfind("\n")
+    try:
+        header = json.loads(f"{text[:header_end]}]}}")
+    except json.JSONDecodeError:
+        header = None
+    current_header = {
+        "schema_version": migrations.REPORT_SCHEMA_VERSION,
+        "columns": REPORT_COLUMNS,
+        "data": [],
+    }
+    data = text[header_end + 1 : data_end]
+    row_lines = data.split(",\n") if data else []
+    if (
+        header == current_header
+        and text[data_end:] == "\n]}"
+        and data.count("\n") == max(0, len(row_lines) - 1)
+        and f"\n{data}".count('\n["') == len(row_lines)
+        and f"{data},\n".count("],\n") == len(row_lines)
+    ):
+        return row_lines
+    return None
+
+
+def report_row_offsets(text: str) -> np.ndarray:
+    """Return the byte offset of each row line in report file text
+
+    An extra offset follows the last row, so row p spans offsets[p] to
+    offsets[p + 1] - 2, leaving out the ",\n" or "\n]" after it.
+    """
+    data = text.encode()
+    header_end, data_end = data.find(b"\n"), data.rfind(b"\n")
+    # rows never hold a raw newline, so each one after the header starts a row
+    newlines = np.flatnonzero(
+        np.frombuffer(data, dtype=np.uint8)[header_end:data_end] == ord("\n")
+    )
+    return np.append(newlines + header_end + 1, data_end + 2)
+
+
+def load_row_offsets(report_path: str) -> np.ndarray | None:
+    """Load the byte offset of each row in a JSON report's file
+
+    Returns None for archives, and for reports without one row per line.
+    """
+    if archive.is_archived(report_path):
+        return None
+    with open(report_path, "r") as report_file:
+        text = report_file.read()
+    if split_report_text(text) is None:
+        return None
+    return report_row_offsets(text)
+
+
+def load_report_lines(report_path: str) -> list[str]:
+    """Load a report's rows as serialised lines, without parsing them
+
+    Reports saved with every row on one line, or with older columns, are
+    parsed and their rows reserialised instead.
+    """
+    with open(report_path, "r") as report_file:
+        row_lines = split_report_text(report_file.read())
+    if row_lines is not None:
+        return row_lines
+    report_df = load_report_df(report_path)
+    return [json.dumps(row) for row in report_df[REPORT_COLUMNS].values.tolist()]
+
+
+def save_report_lines(row_lines: list[str], report_path: str) -> np.ndarray:
+    """Save a report's rows from their serialised lines, returning their offsets"""
+    text = report_text(REPORT_COLUMNS, row_lines)
+    file_utils.write_file_atomically(text, report_path)
+    return report_row_offsets(text)
+
+
+def create_expense_report(report_path: str) -> None:
+    """Create a new empty expense report
+
+    Raises ReportExistsError if it exists, checked under the report's lock so
+    a report created by another process at the same time is never replaced.
+    """
+    with report_lock(report_path):
+        if report_exists(report_path):
+            name = os.path.basename(report_path).removesuffix(".json")
+            raise exceptions.ReportExistsError(f"Report: '{name}' already exists")
+        journal.begin_change(report_path, "create", lambda: None)
+        save_expense_report(
+            pd.DataFrame({col: [] for col in REPORT_COLUMNS}), report_path
+        )
+        journal.append(report_path, {"op": "create"})
+
+
+def migrate_report_file(report_path: str) -> bool:
+    """Rewrite a report in the current schema, returning False if already current"""
+    with report_lock(report_path):
+        report = load_raw_expense_report(report_path)
+        if report is None or not migrations.needs_migration(report):
+            return False
+        save_expense_report(report_to_df(migrations.migrate(report)), report_path)
+        return True
+
+
+def check_report_files(report_paths: list[str], repair: bool = False) -> list[dict]:
+    """Check report files for corruption, rewriting them from their salvageable rows
+
+    With repair, a damaged report is copied aside and replaced by its intact,
+    valid expenses. Its history is cleared, as it describes the damaged file.
+    """
+    results = fsck.check_reports(report_paths, REPORT_COLUMNS, OPTIONAL_COLUMNS)
+    for report_path, checked in zip(report_paths, results):
+        salvaged = checked.pop("salvaged")
+        checked.update(
+            path=report_path,
+            kept=None if salvaged is None else len(salvaged),
+            backup=None,
+        )
+        if repair and salvaged is not None:
+            with report_lock(report_path):
+                checked["backup"] = fsck.backup_report(report_path)
+                save_expense_report(salvaged, report_path)
+                archive.remove_archive(report_path)
+                journal.clear(report_path)
+    return results
+
+
+def archive_report_file(
+    report_path: str, compression: str = archive.DEFAULT_COMPRESSION
+) -> bool:
+    """Convert a report to a read-only archive, returning False if already archived"""
+    with report_lock(report_path):
+        if archive.is_archived(report_path):
+            return False
+        # validates the report, so archives only ever hold valid expenses
+        report_df = json_to_report_df(report_path)
+        journaled = journal.in_sync(report_path)
+        archive.write_archive(report_df, report_path, compression)
+        os.remove(report_path)
+        if journaled:
+            journal.append(report_path, {"op": "archive"})
+        # restamp derived files against the archive so reads never rebuild them
+        aggregates.save_aggregates(aggregates.build_aggregates(report_df), report_path)
+        search.save_index(search.build_index(report_df), report_path)
+        return True
+
+
+def unarchive_report_file(report_path: str) -> bool:
+    """Convert an archived report back to JSON, returning False if not archived"""
+    with report_lock(report_path):
+        if not archive.is_archived(report_path):
+            return False
+        journaled = journal.in_sync(report_path)
+        report_aggregates = aggregates.load_aggregates(report_path)
+        report_index = search.load_index(report_path)
+        save_expense_report(archive.read_archive(report_path), report_path)
+        archive.remove_archive(report_path)
+        if journaled:
+            journal.append(report_path, {"op": "unarchive"})
+        # restamp derived files against the JSON file, their contents still hold
+        if report_aggregates is not None:
+            aggregates.save_aggregates(report_aggregates, report_path)
+        if report_index is not None:
+            search.save_index(
+                report_index, report_path, row_offsets=load_row_offsets(report_path)
+            )
+        return True
+
+
+def add_missing_columns(report: pd.DataFrame) -> pd.DataFrame:
+    """Add optional columns missing from reports created by older versions"""
+    for col, default in OPTIONAL_COLUMNS.items():
+        if col not in report.columns:
+            report[col] = default
+    return report
 
 
 def str_to_decimal_df_column(report: pd.DataFrame) -> pd.DataFrame:
@@ -45,57 +317,339 @@ def str_to_decimal_df_column(report: pd.DataFrame) -> pd.DataFrame:
     return report
 
 
+def load_report_aggregates(report_path: str) -> dict:
+    """Load a report's precomputed aggregates, rebuilding them if stale"""
+    report_aggregates = aggregates.load_aggregates(report_path)
+    if report_aggregates is None:
+        # fingerprint before reading, so a report changed mid-rebuild stays stale
+        fingerprint = archive.report_fingerprint(report_path)
+        report_aggregates = aggregates.build_aggregates(json_to_report_df(report_path))
+        aggregates.save_aggregates(report_aggregates, report_path, fingerprint)
+    return report_aggregates
+
+
+def update_report_aggregates(
+    report_aggregates: dict,
+    expenses: list[dict[str, str]] | list[list[str]],
+    sign: int,
+    report_path: str,
+) -> None:
+    """Apply added (sign=1) or removed (sign=-1) expenses to saved aggregates"""
+    expenses_df = add_missing_columns(pd.DataFrame(expenses, columns=REPORT_COLUMNS))
+    expenses_df = str_to_decimal_df_column(expenses_df)
+    aggregates.update_aggregates(report_aggregates, expenses_df, sign)
+    aggregates.save_aggregates(report_aggregates, report_path)
+
+
+def report_snapshot(report_path: str) -> str | None:
+    """Return a report's data as JSON for a journal snapshot, or None if deleted"""
+    if not report_exists(report_path):
+        return None
+    if archive.is_archived(report_path):
+        return report_json(load_report_df(report_path))
+    return report_text(REPORT_COLUMNS, load_report_lines(report_path))
+
+
+def save_report_change(
+    row_lines: list[str],
+    report_path: str,
+    positions: list[int],
+    rows: list[list[str]],
+    sign: int,
+) -> None:
+    """Save a report's changed rows and apply the changed rows to its derived files
+
+    Rows inserted (sign=1) or removed (sign=-1) at the 0-based positions
+    update the aggregates and search index without rebuilding them.
+    """
+    # loaded before saving, while they still match the unchanged report
+    report_aggregates = load_report_aggregates(report_path)
+    report_index = load_report_index(report_path)
+    row_offsets = save_report_lines(row_lines, report_path)
+    update_report_aggregates(report_aggregates, rows, sign, report_path)
+    descriptions = [row[REPORT_COLUMNS.index("Description")] for row in rows]
+    search.save_index(
+        search.update_index(report_index, positions, descriptions, sign),
+        report_path,
+        row_offsets=row_offsets,
+    )
+
+
+def insert_lines(
+    row_lines: list[str], positions: list[int], new_lines: list[str]
+) -> list[str]:
+    """Insert row lines so they end up at the given ascending 0-based positions"""
+    merged, start = [], 0
+    for count, (position, line) in enumerate(zip(positions, new_lines)):
+        merged += row_lines[start : position - count]
+        merged.append(line)
+        start = position - count
+    return merged + row_lines[start:]
+
+
+def insert_expense_rows(
+    positions: list[int], rows: list[list[str]], report_path: str
+) -> None:
+    """Insert expense rows at 0-based positions without journaling the change"""
+    # journals written before the optional columns existed hold shorter rows
+    rows = [row + [""] * (len(REPORT_COLUMNS) - len(row)) for row in rows]
+    unarchive_report_file(report_path)
+    row_lines = insert_lines(
+        load_report_lines(report_path), positions, [json.dumps(row) for row in rows]
+    )
+    save_report_change(row_lines, report_path, positions, rows, 1)
+
+
+def remove_expense_rows(positions: list[int], report_path: str) -> list[list[str]]:
+    """Remove expense rows at 0-based positions without journaling the change"""
+    unarchive_report_file(report_path)
+    row_lines = load_report_lines(report_path)
+    for position in positions:
+        if not 0 <= position < len(row_lines):
+            raise KeyError(position)
+
+    removed_rows = [json.loads(row_lines[position]) for position in positions]
+    for position in sorted(set(positions), reverse=True):
+        del row_lines[position]
+    save_report_change(row_lines, report_path, positions, removed_rows, -1)
+    return removed_rows
+
+
+def add_expenses_to_report(
+    expenses: list[dict[str, str]], report_path: str, rule: dict | None = None
+) -> None:
+    """Add new expenses to expense report in a single write
+
+    The recurrence rule the expenses were expanded from, if any, is kept
+    in the journaled change.
+    """
+    with report_lock(report_path):
+        journal.begin_change(
+            report_path, "add", lambda: report_snapshot(report_path)
+        )
+        unarchive_report_file(report_path)
+        row_lines = load_report_lines(report_path)
+        # dates come first in each row, so only they are decoded
+        report_dates = pd.Series(
+            [ROW_DECODER.raw_decode(line, 1)[0] for line in row_lines], dtype=object
+        )
+        new_rows = pd.DataFrame(
+            expenses, columns=REPORT_COLUMNS, dtype=object
+        ).fillna("")
+        # reports are sorted by date, new rows go after existing rows on that date
+        new_rows = new_rows.sort_values(by="Date", kind="stable")
+        insert_at = report_dates.searchsorted(new_rows["Date"], side="right")
+        positions = (insert_at + np.arange(len(new_rows))).tolist()
+        rows = new_rows.values.tolist()
+
+        new_lines = [json.dumps(row) for row in rows]
+        row_lines = insert_lines(row_lines, positions, new_lines)
+        save_report_change(row_lines, report_path, positions, rows, 1)
+        change = {"op": "add", "positions": positions, "rows": rows}
+        if rule is not None:
+            change["rule"] = rule
+        journal.append(report_path, change)
+
+
 def add_expense_to_report(expense: dict[str, str], report_path: str) -> None:
     """Add new expense to expense report"""
-    report = load_expense_report(report_path)
-    report_df = pd.DataFrame(report)
-    # add row to the report_df
-    report_df.loc[len(report_df)] = expense
-    # sort report df by date and reset index so expense reports are in order
-    report_df = report_df.sort_values(by="Date").reset_index(drop=True)
-    save_expense_report(report_df, report_path)
+    add_expenses_to_report([expense], report_path)
 
 
-def rm_description(report_df: pd.DataFrame) -> pd.DataFrame:
-    """Remove description column from report for summary report"""
-    return report_df.drop(columns="Description")
+def rm_expense_from_report(row_id: int, report_path: str) -> dict[str, str]:
+    """Remove an expense from report by ID, returning the removed expense"""
+    with report_lock(report_path):
+        journal.begin_change(
+            report_path, "remove", lambda: report_snapshot(report_path)
+        )
+        # row_id - 1 for correct indexing
+        positions = [row_id - 1]
+        rows = remove_expense_rows(positions, report_path)
+        journal.append(
+            report_path, {"op": "remove", "positions": positions, "rows": rows}
+        )
+        return dict(zip(REPORT_COLUMNS, rows[0]))
 
 
-def group_by_date(report_df: pd.DataFrame) -> pd.DataFrame:
-    """Group the summary report by date"""
-    return report_df.groupby("Date").sum().reset_index()
+def remove_report_files(report_path: str) -> None:
+    """Delete a report's file or archive, aggregates and search index"""
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    archive.remove_archive(report_path)
+    aggregates.remove_aggregates(report_path)
+    search.remove_index(report_path)
 
 
-def rename_amount_to_total(report_df: pd.DataFrame) -> pd.DataFrame:
-    """Rename the 'Amount' column to 'Total' in summary report"""
-    return report_df.rename(columns={"Amount": "Total"})
+def delete_expense_report(report_path: str) -> None:
+    """Delete an expense report, keeping a journal snapshot so it can be undone"""
+    with report_lock(report_path):
+        journal.begin_change(
+            report_path, "delete", lambda: report_snapshot(report_path)
+        )
+        remove_report_files(report_path)
+        journal.append(report_path, {"op": "delete"})
+
+
+def apply_change(change: dict, report_path: str, undo: bool) -> None:
+    """Apply a journaled change to a report, or revert it if undo is True"""
+    op = journal.INVERSE_OPS[change["op"]] if undo else change["op"]
+    if op == "add":
+        insert_expense_rows(change["positions"], change["rows"], report_path)
+    elif op == "remove":
+        remove_expense_rows(change["positions"], report_path)
+    elif op == "delete":
+        remove_report_files(report_path)
+    elif change["op"] == "delete":
+        # undoing a delete restores the snapshot taken before it
+        file_utils.write_file_atomically(
+            journal.read_snapshot(report_path, change["segment"]), report_path
+        )
+    else:
+        save_expense_report(
+            pd.DataFrame({col: [] for col in REPORT_COLUMNS}), report_path
+        )
 
 
-def add_claimable_total(
-    report_df: pd.DataFrame, max_claimable_amount: str
-) -> pd.DataFrame:
-    """Add Claimable Total col to summary report"""
-    report_df["Claimable Total"] = report_df["Amount"].apply(
-        lambda x: (
-            x if max_claimable_amount == "unlimited" else min(x, max_claimable_amount)
-        )
+def undo_report_change(report_path: str) -> dict:
+    """Revert a report's last journaled change, returning the change"""
+    with report_lock(report_path):
+        records = journal.load_records(report_path)
+        journal.check_unchanged(report_path, records)
+        applied, _ = journal.replay(records)
+        if not applied:
+            raise exceptions.JournalError("Error: Nothing to undo")
+
+        change = applied[-1]
+        apply_change(change, report_path, undo=True)
+        journal.append(report_path, {"op": "undo", "target": change["seq"]})
+        return change
+
+
+def redo_report_change(report_path: str) -> dict:
+    """Reapply a report's last undone change, returning the change"""
+    with report_lock(report_path):
+        records = journal.load_records(report_path)
+        journal.check_unchanged(report_path, records)
+        _, undone = journal.replay(records)
+        if not undone:
+            raise exceptions.JournalError("Error: Nothing to redo")
+
+        change = undone[-1]
+        apply_change(change, report_path, undo=False)
+        journal.append(report_path, {"op": "redo", "target": change["seq"]})
+        return change
+
+
+def report_history(report_path: str) -> pd.DataFrame:
+    """Return a report's journaled changes that can be undone or redone"""
+    applied, undone = journal.replay(journal.load_records(report_path))
+    history = [(change, "applied") for change in applied]
+    history += [(change, "undone") for change in reversed(undone)]
+    return pd.DataFrame(
+        [
+            [change["seq"], change["time"], journal.describe(change), status]
+            for change, status in history
+        ],
+        columns=["Change", "Time", "Description", "Status"],
     )
-    return report_df
+
+
+def rebuild_report_index(report_path: str) -> tuple[dict, pd.DataFrame]:
+    """Rebuild and save a report's search index, returning it and the report df"""
+    # fingerprint before reading, so a report changed mid-rebuild stays stale
+    fingerprint = archive.report_fingerprint(report_path)
+    report_df = load_report_df(report_path)
+    index = search.build_index(report_df)
+    search.save_index(index, report_path, fingerprint, load_row_offsets(report_path))
+    return index, report_df
+
+
+def load_report_index(report_path: str) -> dict:
+    """Load a report's search index, rebuilding it if stale"""
+    index = search.load_index(report_path)
+    if index is None:
+        index, _ = rebuild_report_index(report_path)
+    return index
+
+
+def read_report_rows(
+    report_path: str, row_offsets: np.ndarray, positions: list[int]
+) -> list[list[str]]:
+    """Read the rows at 0-based positions of a JSON report, from their offsets"""
+    positions = np.asarray(positions, dtype=np.int64)
+    starts = row_offsets[positions].tolist()
+    ends = (row_offsets[positions + 1] - 2).tolist()
+    with open(report_path, "rb") as report_file:
+        row_lines = []
+        for start, end in zip(starts, ends):
+            report_file.seek(start)
+            row_lines.append(report_file.read(end - start))
+    return json.loads(b"[%s]" % b",".join(row_lines))
+
+
+def load_report_rows(
+    report_path: str, positions: list[int], row_offsets: np.ndarray | None = None
+) -> pd.DataFrame:
+    """Load only the expenses at 0-based positions as a df of string values
+
+    With row_offsets, where each row starts in a JSON report's file, only
+    the rows are read rather than the whole file.
+    """
+    if archive.is_archived(report_path):
+        return add_missing_columns(archive.read_archive(report_path, positions))
+    if row_offsets is not None:
+        rows = read_report_rows(report_path, row_offsets, positions)
+    else:
+        row_lines = load_report_lines(report_path)
+        rows = [json.loads(row_lines[position]) for position in positions]
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS, dtype=object)
+
+
+def search_report(report_path: str, query: str) -> pd.DataFrame:
+    """Return report expenses whose descriptions match the query, with their IDs
+
+    Only the matching expenses are read from the report, unless its index
+    was stale and the whole report was read to rebuild it.
+    """
+    # held so the report's rows can't move between searching and reading them
+    with report_lock(report_path):
+        index, report_df = search.load_index(report_path, mmap_mode="r"), None
+        if index is None:
+            index, report_df = rebuild_report_index(report_path)
+        rows = search.search_index(index, query)
+        if not rows:
+            matches = pd.DataFrame(columns=REPORT_COLUMNS, dtype=object)
+        elif report_df is not None:
+            matches = report_df.iloc[rows]
+        else:
+            matches = load_report_rows(report_path, rows, index["row_offsets"])
+    # report IDs are 1-based row positions
+    matches.insert(0, "ID", [row + 1 for row in rows])
+    matches = str_to_decimal_df_column(matches)
+    return matches.reset_index(drop=True)
 
 
 def add_summary_totals_row(report_df: pd.DataFrame) -> pd.DataFrame:
     """Add row containing grand total and claimable grand total to the summary report"""
     grand_total = report_df["Total"].sum()
     claimable_total = report_df["Claimable Total"].sum()
-    totals_row = {"Date": "", "Total": grand_total, "Claimable Total": claimable_total}
+    totals_row = {
+        report_df.columns[0]: "",
+        "Total": grand_total,
+        "Claimable Total": claimable_total,
+    }
     report_df.loc[len(report_df)] = totals_row
     return report_df
 
 
-def df_add_total_row(report_df: pd.DataFrame) -> pd.DataFrame:
-    """Add total amount row to the report"""
-    total = report_df["Amount"].sum()
-    total_row = {"Date": "", "Amount": total, "Description": ""}
+def df_add_total_row(
+    report_df: pd.DataFrame, total: Decimal | None = None
+) -> pd.DataFrame:
+    """Add total amount row to the report, summing amounts if no total is given"""
+    if total is None:
+        total = report_df["Amount"].sum()
+    total_row = {col: "" for col in report_df.columns}
+    total_row["Amount"] = total
     report_df.loc[len(report_df)] = total_row
     return report_df
 
@@ -105,11 +659,28 @@ def format_currency(value: str, currency: str) -> str:
     return f"{currency}{value}"
 
 
+def format_report_issue(found: dict) -> str:
+    """Format a problem found in a report with where it was found"""
+    location = []
+    if found["offset"] is not None:
+        location.append(f"byte {found['offset']}")
+    if found["id"] is not None:
+        location.append(f"ID {found['id']}")
+    if not location:
+        return found["problem"]
+    return f"{', '.join(location)}: {found['problem']}"
+
+
 def format_report_data(report_df: pd.DataFrame, currency: str) -> pd.DataFrame:
-    """Format report rows e.g. 9.00 -> £9.00"""
-    report_df["Amount"] = report_df["Amount"].apply(
-        lambda x: format_currency(x, currency)
-    )
+    """Format report rows e.g. 9.00 -> £9.00, or 9.00 -> USD 9.00 for coded rows"""
+    report_df["Amount"] = [
+        format_currency(amount, f"{code} " if code else currency)
+        for amount, code in zip(report_df["Amount"], report_df["Currency"])
+    ]
+    if "Converted Amount" in report_df.columns:
+        report_df["Converted Amount"] = report_df["Converted Amount"].apply(
+            lambda x: format_currency(x, currency) if x != "" else x
+        )
     return report_df
 
 
@@ -140,16 +711,45 @@ def format_summary_totals_cell(summary_df: pd.DataFrame, col: str) -> pd.DataFra
     return summary_df
 
 
-def json_to_formatted_report_df(report_path: str, currency: str) -> pd.DataFrame:
-    """Parse JSON report data to formatted report df"""
-    report_data = load_expense_report(report_path)
-    if report_data is None:
-        raise FileNotFoundError("Error: Report does not exist")
-
-    df = pd.DataFrame(report_data)
+def json_to_report_df(report_path: str) -> pd.DataFrame:
+    """Parse JSON report data to an unformatted report df sorted by date"""
+    if archive.is_archived(report_path):
+        # archives hold validated, sorted expenses with typed amounts
+        return archive.read_archive_expenses(report_path)
+    df = load_report_df(report_path)
+    if df is None:
+        raise exceptions.ReportNotFoundError("Error: Report does not exist")
+
+    invalid = validation.invalid_rows(df)
+    if invalid.any():
+        # report IDs are 1-based row positions
+        invalid_ids = ", ".join(str(pos + 1) for pos in invalid.nonzero()[0])
+        raise exceptions.InvalidReportError(
+            f"Error: Report has invalid expenses at IDs: {invalid_ids}"
+        )
     df = str_to_decimal_df_column(df)
-    df_sorted = df.sort_values(by="Date").reset_index(drop=True)
-    df_plus_total = df_add_total_row(df_sorted)
+    return df.sort_values(by="Date", kind="stable").reset_index(drop=True)
+
+
+def json_to_summary_df(
+    report_path: str,
+    cap_policy: caps.CapPolicy,
+    by: str = "day",
+    converter: fx.CurrencyConverter | None = None,
+) -> pd.DataFrame:
+    """Build an unformatted summary df, without a totals row, grouped by period"""
+    if not report_exists(report_path):
+        raise exceptions.ReportNotFoundError("Error: Report does not exist")
+
+    report_aggregates = load_report_aggregates(report_path)
+    return aggregates.summarise(report_aggregates, cap_policy, by, converter)
+
+
+def format_report_df(
+    report_df: pd.DataFrame, currency: str, total: Decimal | None = None
+) -> pd.DataFrame:
+    """Format report df for display, adding a total row"""
+    df_plus_total = df_add_total_row(report_df, total)
 
     formatted_df = format_report_data(df_plus_total, currency)
     formatted_df = format_grand_total_cell(formatted_df, "Amount", "Total")
@@ -157,21 +757,9 @@ def json_to_formatted_report_df(report_path: str, currency: str) -> pd.DataFrame
     return formatted_df
 
 
-def json_to_formatted_summary_df(
-    report_path: str, max_claimable_amount: str, currency: str
-) -> pd.DataFrame:
-    """Parse JSON report data to formatted report summary df"""
-    report_data = load_expense_report(report_path)
-    if report_data is None:
-        raise FileNotFoundError("Error: Report does not exist")
-
-    df = pd.DataFrame(report_data)
-    df = str_to_decimal_df_column(df)
-    df_minus_descrip = rm_description(df)
-    df_grouped = group_by_date(df_minus_descrip)
-    df_plus_claim_tot = add_claimable_total(df_grouped, max_claimable_amount)
-    df_renamed = rename_amount_to_total(df_plus_claim_tot)
-    df_plus_tot_row = add_summary_totals_row(df_renamed)
+def format_summary_df(summary_df: pd.DataFrame, currency: str) -> pd.DataFrame:
+    """Format summary df for display, adding a totals row"""
+    df_plus_tot_row = add_summary_totals_row(summary_df)
 
     formatted_df1 = format_summary_data(df_plus_tot_row, currency)
     formatted_df2 = format_grand_total_cell(formatted_df1, "Total", "Total")
@@ -207,14 +795,20 @@ def create_table(title_prefix: str, report_name: str) -> Table:
 def populate_report_table(table: Table, report_df: pd.DataFrame) -> Table:
     """populate table with data from expense report"""
     # Add columns to table
-    columns = ["ID", "Date", "Amount", "Description"]
+    columns = ["ID", "Date", "Amount", "Description", "Category"]
     for col in columns:
         table.add_column(col)
 
     # Add all rows to table except total row
     for index, row in report_df[:-1].iterrows():
         table.add_row(
-            *[str(index + 1), row["Date"], row["Amount"], row["Description"]],
+            *[
+                str(index + 1),
+                row["Date"],
+                row["Amount"],
+                row["Description"],
+                row["Category"],
+            ],
             style=Colours.body,
         )
         # Add a line between each row
@@ -222,6 +816,48 @@ def populate_report_table(table: Table, report_df: pd.DataFrame) -> Table:
     return table
 
 
+def populate_search_table(table: Table, results_df: pd.DataFrame) -> Table:
+    """Populate table with expenses matching a search"""
+    columns = ["Report", "ID", "Date", "Amount", "Description", "Category"]
+    for col in columns:
+        table.add_column(col)
+
+    for row in results_df[columns].astype(str).itertuples(index=False):
+        table.add_row(*row, style=Colours.body)
+        # Add a line between each row
+        table.add_section()
+    return table
+
+
+def populate_history_table(table: Table, history_df: pd.DataFrame) -> Table:
+    """Populate table with a report's journaled changes"""
+    for col in history_df.columns:
+        table.add_column(col)
+
+    for row in history_df.astype(str).itertuples(index=False):
+        style = Colours.body if row.Status == "applied" else f"dim {Colours.body}"
+        table.add_row(*row, style=style)
+    return table
+
+
+def populate_load_test_table(table: Table, stats_df: pd.DataFrame) -> Table:
+    """Populate table with the counts and latencies of load test operations"""
+    for col in ["Operation", *stats_df.columns]:
+        table.add_column(col)
+
+    for operation, row in stats_df.iterrows():
+        style = Colours.total if operation == "all" else Colours.body
+        table.add_row(
+            operation,
+            str(int(row["Count"])),
+            str(int(row["Errors"])),
+            f"{row['p50 ms']:.1f}",
+            f"{row['p99 ms']:.1f}",
+            style=style,
+        )
+    return table
+
+
 def populate_report_table_total(table: Table, report_df: pd.DataFrame) -> Table:
     """Populate table with total row"""
     # Add extra line after report data rows
@@ -234,13 +870,13 @@ def populate_report_table_total(table: Table, report_df: pd.DataFrame) -> Table:
 def populate_summary_table(table: Table, summary_df: pd.DataFrame) -> Table:
     """Populate table with data from summary report"""
     # Add columns to table
-    columns = ["Date", "Total", "Claimable Total"]
+    columns = summary_df.columns
     for col in columns:
         table.add_column(col)
 
     # Add all rows from to table except total row
     lst_data = [
-        summary_df["Date"],
+        summary_df[columns[0]],
         summary_df["Total"].tolist(),
         summary_df["Claimable Total"].tolist(),
     ]
@@ -271,11 +907,3 @@ def parse_report_to_xlsx(
     with pd.ExcelWriter(export_path, engine="xlsxwriter") as writer:
         report_df.to_excel(writer, sheet_name="Expense Report", index=False)
         summary_df.to_excel(writer, sheet_name="Summary Report", index=False)
-
-
-def rm_row(row_id: int, report_df: pd.DataFrame) -> pd.DataFrame:
-    """Delete an expense row from report"""
-    for item in report_df.values():
-        # row_id - 1 for correct indexing
-        del item[str(row_id - 1)]
-    return report_df
@@ -0,0 +1,122 @@
+"""Module for validating whole columns of expense data at once"""
+
+import numpy as np
+import pandas as pd
+from pydantic import TypeAdapter, ValidationError
+from src import user_input
+
+
+EXPENSE_LIST_ADAPTER = TypeAdapter(list[user_input.ReportDataTemplate])
+
+
+def is_str(values: pd.Series) -> np.ndarray:
+    """Return a mask of values that are strings"""
+    return values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+
+
+def str_values(values: pd.Series) -> pd.Series:
+    """Return string values as python objects, non-strings as missing"""
+    # object dtype keeps python re semantics for .str, matching the
+    # single-value validators, whatever string dtype pandas loaded
+    return values.astype(object).where(is_str(values))
+
+
+def valid_monetary_values(values: pd.Series) -> np.ndarray:
+    """Return a mask of values matching the monetary value format"""
+    matches = str_values(values).str.match(user_input.VALID_MONEY_FORMAT, na=False)
+    return matches.to_numpy(dtype=bool)
+
+
+def valid_dates(values: pd.Series) -> np.ndarray:
+    """Return a mask of values that are valid yyyy-mm-dd dates"""
+    parsed = pd.to_datetime(
+        str_values(values), format=user_input.VALID_DATE_FORMAT, errors="coerce"
+    )
+    # pandas accepts year 0 and negative years, which strptime rejects
+    mask = (parsed.notna() & (parsed.dt.year >= 1)).to_numpy(dtype=bool, copy=True)
+    # pandas rejects some dates strptime accepts, e.g. years outside its
+    # timestamp range, so recheck the few failures one at a time
+    for position in np.flatnonzero(~mask & is_str(values)):
+        mask[position] = user_input.is_valid_date(values.iloc[position])
+    return mask
+
+
+def valid_descriptions(values: pd.Series) -> np.ndarray:
+    """Return a mask of values that are non-blank strings"""
+    filled = str_values(values).str.strip().fillna("")
+    return (filled != "").to_numpy(dtype=bool)
+
+
+def valid_currency_codes(values: pd.Series) -> np.ndarray:
+    """Return a mask of values that are blank or 3 letter currency codes"""
+    codes = str_values(values)
+    matches = codes.str.match(user_input.VALID_CURRENCY_CODE_FORMAT, na=False)
+    return (matches | (codes == "")).to_numpy(dtype=bool)
+
+
+COLUMN_VALIDATORS = {
+    "Date": valid_dates,
+    "Amount": valid_monetary_values,
+    "Description": valid_descriptions,
+    "Currency": valid_currency_codes,
+}
+SCALAR_VALIDATORS = {
+    "Date": user_input.is_valid_date,
+    "Amount": user_input.is_valid_monetary_value,
+    "Description": lambda value: value.strip() != "",
+    "Currency": user_input.is_valid_currency_code,
+}
+# columns shorter than this are checked value by value, as pandas' per-call
+# overhead outweighs vectorizing a handful of values
+SCALAR_VALIDATION_ROWS = 32
+
+
+def scalar_validator(col: str):
+    """Return a column validator applying the single-value validator per value"""
+
+    def validator(values: pd.Series) -> np.ndarray:
+        return np.array(
+            [
+                isinstance(value, str) and SCALAR_VALIDATORS[col](value)
+                for value in values
+            ],
+            dtype=bool,
+        )
+
+    return validator
+
+
+def expense_error_masks(report_df: pd.DataFrame) -> pd.DataFrame:
+    """Return a df of per-row error masks, True where a column value is invalid"""
+    errors = {}
+    for col, validator in COLUMN_VALIDATORS.items():
+        if len(report_df) < SCALAR_VALIDATION_ROWS:
+            validator = scalar_validator(col)
+        if col in report_df.columns:
+            errors[col] = ~validator(report_df[col])
+        else:
+            errors[col] = np.ones(len(report_df), dtype=bool)
+    return pd.DataFrame(errors, index=report_df.index)
+
+
+def invalid_rows(report_df: pd.DataFrame) -> np.ndarray:
+    """Return a mask of rows with at least one invalid value"""
+    return expense_error_masks(report_df).any(axis=1).to_numpy(dtype=bool)
+
+
+def validate_expense_records(
+    records: list[dict[str, str]],
+) -> list[user_input.ReportDataTemplate]:
+    """Validate the types of many expense records with a single model pass"""
+    return EXPENSE_LIST_ADAPTER.validate_python(records)
+
+
+def record_type_errors(records: list[dict[str, str]]) -> np.ndarray:
+    """Return a mask of records that do not match the expense template types"""
+    mask = np.zeros(len(records), dtype=bool)
+    try:
+        validate_expense_records(records)
+    except ValidationError as e:
+        for error in e.errors():
+            mask[error["loc"][0]] = True
+    return mask
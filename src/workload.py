@@ -0,0 +1,343 @@
+"""Module for generating synthetic reports and load testing a report directory"""
+
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src import api
+from src import caps
+from src import fx
+
+
+# share of expenses, median amount and amount spread of each category
+CATEGORY_PROFILES = {
+    "meals": (0.45, 14.0, 0.5),
+    "travel": (0.2, 35.0, 0.8),
+    "office": (0.15, 22.0, 0.7),
+    "entertainment": (0.1, 60.0, 0.6),
+    "lodging": (0.1, 120.0, 0.35),
+}
+CATEGORY_VENDORS = {
+    "meals": ["Pret", "Starbucks", "Subway", "Wagamama", "Nando's", "Greggs"],
+    "travel": ["Uber", "Trainline", "National Rail", "TfL", "Shell", "Heathrow"],
+    "office": ["Amazon", "Staples", "Ryman", "Apple", "Currys"],
+    "entertainment": ["Odeon", "Hawksmoor", "Dishoom", "Ticketmaster"],
+    "lodging": ["Premier Inn", "Hilton", "Marriott", "Travelodge", "Airbnb"],
+}
+CATEGORY_ITEMS = {
+    "meals": ["lunch", "coffee", "breakfast", "dinner", "team lunch"],
+    "travel": ["taxi", "train ticket", "fuel", "parking", "bus fare"],
+    "office": ["printer paper", "monitor", "stationery", "charger", "keyboard"],
+    "entertainment": ["client dinner", "team event", "conference tickets"],
+    "lodging": ["hotel night", "hotel stay", "accommodation"],
+}
+# weekend expenses are less common than weekday ones
+WEEKEND_WEIGHT = 0.3
+MIN_AMOUNT = 0.5
+# expenses added during a load test are dated within this many recent days
+UPDATE_DAYS = 30
+
+OPERATIONS = ["update", "summary", "rm", "export"]
+DEFAULT_MIX = {"update": 50, "summary": 30, "rm": 10, "export": 10}
+# descriptions of expenses added during a load test end with a tag naming
+# the run, worker and operation, so lost updates can be counted
+TAG_FORMAT = r" #lt(\d+\.\d+\.\d+)$"
+
+
+def generated_report_names(prefix: str, count: int) -> list[str]:
+    """Return the names of the reports generated with a prefix"""
+    return [f"{prefix}-{number:04d}" for number in range(1, count + 1)]
+
+
+def generate_expenses(
+    rng: np.random.Generator, count: int, start: str, end: str
+) -> list[dict[str, str]]:
+    """Return expenses with realistic dates, amounts and descriptions
+
+    Amounts are log-normal around each category's median, vendors follow
+    a Zipf-like popularity and expenses are rarer at weekends.
+    """
+    dates = pd.date_range(start, end, freq="D")
+    day_weights = np.where(dates.dayofweek >= 5, WEEKEND_WEIGHT, 1.0)
+    day_positions = np.sort(
+        rng.choice(len(dates), size=count, p=day_weights / day_weights.sum())
+    )
+    expense_dates = dates[day_positions].strftime("%Y-%m-%d")
+
+    categories = list(CATEGORY_PROFILES)
+    shares = np.array([CATEGORY_PROFILES[category][0] for category in categories])
+    category_positions = rng.choice(len(categories), size=count, p=shares)
+
+    expenses = []
+    for date, category_position in zip(expense_dates, category_positions):
+        category = categories[category_position]
+        _, median, spread = CATEGORY_PROFILES[category]
+        vendors = CATEGORY_VENDORS[category]
+        popularity = 1 / np.arange(1, len(vendors) + 1)
+        vendor = vendors[rng.choice(len(vendors), p=popularity / popularity.sum())]
+        item = CATEGORY_ITEMS[category][rng.integers(len(CATEGORY_ITEMS[category]))]
+        amount = max(MIN_AMOUNT, rng.lognormal(np.log(median), spread))
+        expenses.append(
+            {
+                "Date": date,
+                "Amount": f"{amount:.2f}",
+                "Description": f"{vendor} {item}",
+                "Category": category,
+                "Currency": "",
+            }
+        )
+    return expenses
+
+
+def generate_reports(
+    store: "api.ExpenseStore",
+    prefix: str,
+    reports: int,
+    expenses: int,
+    start: str,
+    end: str,
+    seed: int = 0,
+) -> list[str]:
+    """Create reports of synthetic expenses, returning their names"""
+    rng = np.random.default_rng(seed)
+    names = generated_report_names(prefix, reports)
+    for name in names:
+        store.create_report(name).add_expenses(
+            generate_expenses(rng, expenses, start, end)
+        )
+    return names
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    """Parse an operation mix, e.g. 'update=50,summary=30,rm=10,export=10'"""
+    weights = {}
+    for part in mix.split(","):
+        operation, _, weight = part.partition("=")
+        operation = operation.strip()
+        if operation not in OPERATIONS or not weight.strip().isdigit():
+            raise ValueError(f"'{part}' is not an operation=weight pair")
+        weights[operation] = int(weight)
+    if sum(weights.values()) == 0:
+        raise ValueError("At least one operation needs a weight above 0")
+    return weights
+
+
+def tagged_expenses(report_df: pd.DataFrame) -> pd.Series:
+    """Return the load test tags of a report's expenses, missing for untagged ones"""
+    return report_df["Description"].astype(object).str.extract(TAG_FORMAT)[0]
+
+
+def run_expense_counts(
+    store: "api.ExpenseStore", names: list[str], run: int
+) -> dict[str, int]:
+    """Return how many expenses in each report were not added by a load test run"""
+    counts = {}
+    for name in names:
+        tags = tagged_expenses(store.report(name).expenses())
+        counts[name] = int((~tags.str.startswith(f"{run}.", na=False)).sum())
+    return counts
+
+
+def generated_reports(store: "api.ExpenseStore", prefix: str) -> list[str]:
+    """Return the names of the reports in a store generated with a prefix"""
+    pattern = re.compile(rf"{re.escape(prefix)}-\d{{4}}")
+    return [name for name in store.report_names() if pattern.fullmatch(name)]
+
+
+def recent_dates(days: int = UPDATE_DAYS) -> tuple[str, str]:
+    """Return the date range of the last few days, in which expenses are added"""
+    today = pd.Timestamp.today().normalize()
+    start = today - pd.Timedelta(days=days)
+    return start.strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
+
+
+def run_operation(
+    report: "api.Report",
+    operation: str,
+    rng: np.random.Generator,
+    tag: str,
+    live: list[str],
+    cap_policy: caps.CapPolicy,
+    export_dir: str,
+) -> bool:
+    """Run one operation against a report, returning False if there was nothing to do"""
+    if operation == "update":
+        expense = generate_expenses(rng, 1, *recent_dates())[0]
+        expense["Description"] = f"{expense['Description']} #lt{tag}"
+        report.add_expense(expense)
+        live.append(tag)
+    elif operation == "summary":
+        report.summary(cap_policy, str(rng.choice(["day", "week", "month"])))
+    elif operation == "rm":
+        # only this worker's expenses are removed, so removals are checkable,
+        # and the lock keeps other workers from moving the ID before removal
+        with report.lock():
+            tags = tagged_expenses(report.expenses()).tolist()
+            present = [own for own in live if own in tags]
+            if not present:
+                return False
+            removed = present[rng.integers(len(present))]
+            report.remove_expense(tags.index(removed) + 1)
+        live.remove(removed)
+    elif operation == "export":
+        report.export(export_dir, "csv", cap_policy)
+    return True
+
+
+def run_worker(
+    report_dir: str,
+    converter: fx.CurrencyConverter,
+    names: list[str],
+    operations: int,
+    mix: dict[str, int],
+    cap_policy: caps.CapPolicy,
+    run: int,
+    worker: int,
+    seed: int,
+) -> dict:
+    """Run a worker process's operations, timing each one
+
+    Returns the operation samples and, per report, the tags of expenses the
+    worker added that should still exist and those it removed.
+    """
+    rng = np.random.default_rng([seed, worker])
+    store = api.ExpenseStore(report_dir, converter)
+    choices = list(mix)
+    weights = np.array([mix[operation] for operation in choices], dtype=float)
+    live = {name: [] for name in names}
+    removed = {name: [] for name in names}
+    samples, skipped = [], 0
+    export_dir = tempfile.mkdtemp(prefix="exptrack-loadtest-")
+
+    try:
+        for number in range(operations):
+            operation = choices[rng.choice(len(choices), p=weights / weights.sum())]
+            name = names[rng.integers(len(names))]
+            before = list(live[name])
+            error = None
+            started = time.time()
+            began = time.perf_counter()
+            try:
+                done = run_operation(
+                    store.report(name),
+                    operation,
+                    rng,
+                    f"{run}.{worker}.{number}",
+                    live[name],
+                    cap_policy,
+                    export_dir,
+                )
+            except Exception as e:
+                # failures are measured, not raised, so the run carries on
+                error, done = type(e).__name__, True
+            latency = time.perf_counter() - began
+            if not done:
+                skipped += 1
+                continue
+            removed[name].extend(set(before) - set(live[name]))
+            samples.append((operation, started, latency, error))
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+
+    return {"samples": samples, "live": live, "removed": removed, "skipped": skipped}
+
+
+def count_lost_updates(
+    store: "api.ExpenseStore",
+    names: list[str],
+    run: int,
+    counts_before: dict[str, int],
+    results: list[dict],
+) -> int:
+    """Count changes missing from the reports once every worker has finished
+
+    An expense is lost if it was added and is gone without being removed,
+    was removed and is back, or was there before the run and is gone.
+    """
+    lost = 0
+    counts_after = run_expense_counts(store, names, run)
+    for name in names:
+        present = set(tagged_expenses(store.report(name).expenses()).dropna())
+        expected = {tag for result in results for tag in result["live"][name]}
+        removed = {tag for result in results for tag in result["removed"][name]}
+        lost += len(expected - present) + len(removed & present)
+        lost += max(0, counts_before[name] - counts_after[name])
+    return lost
+
+
+def load_test(
+    store: "api.ExpenseStore",
+    names: list[str],
+    processes: int,
+    operations: int,
+    mix: dict[str, int],
+    cap_policy: caps.CapPolicy | None = None,
+    seed: int = 0,
+) -> dict:
+    """Replay a mix of operations from concurrent processes against reports
+
+    Each of the processes runs its operations against reports picked at
+    random, then the reports are checked for lost updates. Returns the
+    per-operation stats, overall throughput and error and lost update counts.
+    """
+    cap_policy = cap_policy or caps.CapPolicy()
+    run = time.time_ns()
+    counts_before = run_expense_counts(store, names, run)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                run_worker,
+                store.report_dir,
+                store.converter,
+                names,
+                operations,
+                mix,
+                cap_policy,
+                run,
+                worker,
+                seed,
+            )
+            for worker in range(processes)
+        ]
+        results = [future.result() for future in futures]
+
+    samples = pd.DataFrame(
+        [sample for result in results for sample in result["samples"]],
+        columns=["Operation", "Started", "Latency", "Error"],
+    )
+    return {
+        "stats": operation_stats(samples),
+        "throughput": throughput(samples),
+        "errors": samples["Error"].value_counts().to_dict(),
+        "skipped": sum(result["skipped"] for result in results),
+        "lost_updates": count_lost_updates(
+            store, names, run, counts_before, results
+        ),
+    }
+
+
+def throughput(samples: pd.DataFrame) -> float:
+    """Return operations per second between the first start and last finish"""
+    if samples.empty:
+        return 0.0
+    elapsed = (samples["Started"] + samples["Latency"]).max() - samples["Started"].min()
+    return len(samples) / elapsed if elapsed > 0 else 0.0
+
+
+def operation_stats(samples: pd.DataFrame) -> pd.DataFrame:
+    """Return the count, errors and p50 and p99 latency in ms of each operation"""
+    samples = pd.concat([samples, samples.assign(Operation="all")])
+    grouped = samples.groupby("Operation", sort=False)
+    stats = pd.DataFrame(
+        {
+            "Count": grouped.size(),
+            "Errors": grouped["Error"].count(),
+            "p50 ms": grouped["Latency"].quantile(0.5) * 1000,
+            "p99 ms": grouped["Latency"].quantile(0.99) * 1000,
+        }
+    )
+    return stats.reindex([*OPERATIONS, "all"]).dropna(subset=["Count"])
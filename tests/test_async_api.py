@@ -0,0 +1,108 @@
+"""Tests for concurrent reads and writes through the asyncio API"""
+
+import asyncio
+from decimal import Decimal
+from src import api
+from src import async_api
+from src import fx
+
+
+ADDS = 60
+REMOVES = 20
+
+
+def make_store(tmp_path, max_workers: int = 8) -> async_api.AsyncExpenseStore:
+    """Return an async store over a temporary reports directory"""
+    store = api.ExpenseStore(
+        str(tmp_path / "reports"), fx.CurrencyConverter(str(tmp_path / "rates.csv"))
+    )
+    return async_api.AsyncExpenseStore(store, max_workers=max_workers)
+
+
+def expense(number: int, date: str | None = None) -> dict[str, str]:
+    """Return an expense whose amount and description identify it"""
+    return {
+        "Date": date or f"2024-01-{number % 28 + 1:02d}",
+        "Amount": f"{number}.00",
+        "Description": f"expense {number}",
+    }
+
+
+def test_concurrent_adds_are_not_lost(tmp_path):
+    async def run():
+        async with make_store(tmp_path) as store:
+            await store.create_report("trip")
+            await asyncio.gather(
+                *(store.add_expense("trip", expense(n)) for n in range(1, ADDS + 1))
+            )
+            return await store.expenses("trip")
+
+    report_df = asyncio.run(run())
+    assert len(report_df) == ADDS
+    assert sorted(report_df["Description"]) == sorted(
+        f"expense {n}" for n in range(1, ADDS + 1)
+    )
+    assert report_df["Date"].is_monotonic_increasing
+
+
+def test_mixed_reads_and_writes_keep_every_update(tmp_path):
+    # expenses to remove are dated before all others, so ID 1 is always one
+    stale = [expense(1000 + n, "2023-12-01") for n in range(REMOVES)]
+
+    async def run():
+        async with make_store(tmp_path) as store:
+            await store.create_report("trip")
+            await store.add_expenses("trip", stale)
+            writes = [store.add_expense("trip", expense(n)) for n in range(1, ADDS + 1)]
+            writes += [store.remove_expense("trip", 1) for _ in range(REMOVES)]
+            reads = [store.summary("trip", by="month") for _ in range(ADDS)]
+            reads += [store.search("expense", ["trip"]) for _ in range(REMOVES)]
+            results = await asyncio.gather(*writes, *reads)
+            return results, await store.expenses("trip"), await store.summary("trip")
+
+    results, report_df, summary_df = asyncio.run(run())
+    removed = results[ADDS : ADDS + REMOVES]
+    assert sorted(row["Description"] for row in removed) == sorted(
+        row["Description"] for row in stale
+    )
+    assert len(report_df) == ADDS
+    assert set(report_df["Description"]) == {
+        f"expense {n}" for n in range(1, ADDS + 1)
+    }
+    assert summary_df["Total"].sum() == sum(Decimal(n) for n in range(1, ADDS + 1))
+
+
+def test_stores_sharing_a_directory_keep_every_update(tmp_path):
+    # separate stores don't share asyncio locks, the report's file lock orders them
+    async def run():
+        async with make_store(tmp_path) as first, make_store(tmp_path) as second:
+            await first.create_report("trip")
+            await asyncio.gather(
+                *(
+                    (first if n % 2 else second).add_expense("trip", expense(n))
+                    for n in range(1, ADDS + 1)
+                )
+            )
+            return await first.expenses("trip")
+
+    report_df = asyncio.run(run())
+    assert len(report_df) == ADDS
+    assert report_df["Amount"].sum() == sum(Decimal(n) for n in range(1, ADDS + 1))
+
+
+def test_undo_and_redo_interleave_with_reads(tmp_path):
+    async def run():
+        async with make_store(tmp_path) as store:
+            await store.create_report("trip")
+            await store.add_expenses("trip", [expense(n) for n in range(1, 11)])
+            await store.add_expense("trip", expense(99))
+            changes = [store.undo("trip"), store.redo("trip")] * 5
+            reads = [store.expenses("trip") for _ in range(10)]
+            results = await asyncio.gather(*changes, *reads)
+            return results[len(changes) :], await store.expenses("trip")
+
+    reads, report_df = asyncio.run(run())
+    # every read sees the report with or without the last expense, never torn
+    assert {len(read) for read in reads} <= {10, 11}
+    assert len(report_df) == 11
+    assert "expense 99" in set(report_df["Description"])
@@ -0,0 +1,55 @@
+"""Tests that batch validation matches the single-value validators"""
+
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from src import api
+from src import exceptions
+from src import user_input
+from src import validation
+
+
+FUZZ_VALUES = 50000
+# fragments joined into date-like strings, covering formats pandas and
+# strptime may disagree on
+DATE_PARTS = [
+    "2024", "1999", "0000", "0001", "9999", "10000", "-2444", "-1", "24",
+    "1", "01", "02", "12", "13", "00", "29", "30", "31", "-", "+", " ", "",
+    "T", "a", "٢٠٢٤",
+]
+DATE_SEPARATORS = ["-", "", " ", "/", "--"]
+
+
+def fuzzed_dates(count: int) -> list[str]:
+    """Return date-like strings built from random fragments"""
+    rng = random.Random(0)
+    return [
+        rng.choice(DATE_PARTS)
+        + rng.choice(DATE_SEPARATORS)
+        + rng.choice(DATE_PARTS)
+        + rng.choice(DATE_SEPARATORS)
+        + rng.choice(DATE_PARTS)
+        for _ in range(count)
+    ]
+
+
+def test_valid_dates_matches_is_valid_date():
+    values = fuzzed_dates(FUZZ_VALUES) + ["0000-07-01", "-2444-1-4", "2024-02-29"]
+    mask = validation.valid_dates(pd.Series(values, dtype=object))
+    expected = np.array([user_input.is_valid_date(value) for value in values])
+    mismatched = [value for value, ok in zip(values, mask == expected) if not ok]
+    assert mismatched == []
+
+
+@pytest.mark.parametrize("date", ["0000-07-01", "-2444-1-4", "--01-01"])
+def test_batches_reject_dates_before_year_1(date):
+    # batches this long are validated column-wise rather than value by value
+    rows = validation.SCALAR_VALIDATION_ROWS + 1
+    expenses = [
+        {"Date": "2024-01-01", "Amount": "1.00", "Description": "Lunch"}
+        for _ in range(rows)
+    ]
+    expenses[-1]["Date"] = date
+    with pytest.raises(exceptions.InvalidExpenseError):
+        api.check_valid_expenses(expenses)